@@ -0,0 +1,181 @@
+"""消息分发性能基准
+
+加载 config.MODULES_ON 中的真实服务, 以不联网的桩对象代替 OneBot 连接,
+生成一批模拟的群消息(前缀指令、完全匹配、关键词闲聊、会战`!`指令、图片等), 按事件总线的顺序
+先送入`on_message`的多路复用(会战`!`指令等经此处理), 再送入`msghandler.handle_message`,
+并等待执行器处理完毕, 报告吞吐量与总体/各触发阶段的 p50/p99 耗时.
+
+ServiceFunc 与`on_message`处理函数的函数体在计时期间被替换为空协程, 因此只测量分发本身, 不会访问网络.
+
+用法: python bench.py [-n 20000] [--seed 0] [--groups 50] [--log]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from time import perf_counter
+
+import hoshino
+from hoshino import CanceledException, metrics, msghandler, multiplexer, trigger
+from hoshino.executor import executor
+from hoshino.typing import CQEvent, Message, MessageSegment
+
+
+class StubApi:
+    """代替 aiocqhttp 的 api 对象, 所有 API 调用立即返回空结果"""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+
+    async def call_action(self, action, **params):
+        self.calls[action] += 1
+        if action.startswith('send'):
+            return {'message_id': self.calls[action]}
+        if action.endswith('_list'):
+            return []
+        return {}
+
+    def __getattr__(self, action):
+        async def call(**params):
+            return await self.call_action(action, **params)
+        return call
+
+
+CHATTER = '今天的会战打得怎么样啊我又歪了好气哦谁来帮我看看这个阵容能不能打过对面公主连结'
+
+
+def _rand_text(rnd: random.Random, lo=2, hi=20) -> str:
+    return ''.join(rnd.choice(CHATTER) for _ in range(rnd.randint(lo, hi)))
+
+
+def gen_messages(n: int, rnd: random.Random):
+    prefixes = list(trigger.prefix.allprefix) or ['help']
+    suffixes = [s[::-1] for s in trigger.suffix.allsuffix] or ['帮助']
+    fullmatches = list(trigger.fullmatch.allword) or ['help']
+    keywords = [kw for kw in trigger.keyword.allkw if kw] or ['你好']
+    kinds = (
+        ('prefix', 20, lambda: rnd.choice(prefixes) + ' ' + _rand_text(rnd, 0, 8)),
+        ('suffix', 5, lambda: _rand_text(rnd, 1, 6) + rnd.choice(suffixes)),
+        ('fullmatch', 15, lambda: rnd.choice(fullmatches)),
+        ('keyword', 10, lambda: _rand_text(rnd) + rnd.choice(keywords) + _rand_text(rnd, 0, 5)),
+        ('chatter', 35, lambda: _rand_text(rnd, 2, 40)),
+        ('clanbattle', 10, lambda: rnd.choice(('!', '！')) + rnd.choice(('出刀', '查树', '挂树', '预约', '进度', '出刀记录'))
+            + ' ' + str(rnd.randint(1, 3000)) + rnd.choice(('w', 'W', ''))),
+        ('image', 5, lambda: Message(_rand_text(rnd, 0, 6)) + MessageSegment.image('file:///dev/null')),
+    )
+    population = [k for k in kinds for _ in range(k[1])]
+    for _ in range(n):
+        name, _, make = rnd.choice(population)
+        yield name, make()
+
+
+def make_event(message, group_id: int, user_id: int, message_id: int) -> CQEvent:
+    return CQEvent({
+        'post_type': 'message',
+        'message_type': 'group',
+        'sub_type': 'normal',
+        'self_id': 10000,
+        'group_id': group_id,
+        'user_id': user_id,
+        'message_id': message_id,
+        'message': Message(message),
+        'raw_message': str(message),
+        'sender': {'user_id': user_id, 'role': 'member'},
+        'anonymous': None,
+        'to_me': False,
+    })
+
+
+def percentile(samples, p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def run(n: int, seed: int, groups: int):
+    bot = hoshino.get_bot()
+    bot._api = StubApi()
+
+    # 只测分发: 用空协程代替全部 ServiceFunc 与 on_message 处理函数的函数体, 并记录被处理的消息
+    handled_ids = set()
+    async def noop(bot, ev):
+        handled_ids.add(ev.message_id)
+    for t in trigger.chain:
+        for _, sf in t._entries:
+            sf.func = noop
+    mux = multiplexer.get('group')
+    for f in mux.funcs:
+        f.func = noop
+
+    stage_samples = defaultdict(list)
+    observe_stage = metrics.observe_stage
+    def record_stage(stage, elapsed, hit):
+        stage_samples[stage].append(elapsed)
+        observe_stage(stage, elapsed, hit)
+    metrics.observe_stage = record_stage
+
+    rnd = random.Random(seed)
+    messages = list(gen_messages(n, rnd))
+    events = [
+        (kind, make_event(msg, rnd.randint(1, groups), rnd.randint(1, 10 ** 6), i))
+        for i, (kind, msg) in enumerate(messages)
+    ]
+
+    total = []
+    by_kind = defaultdict(list)
+    mux_samples = []
+    try:
+        begin = perf_counter()
+        for kind, ev in events:
+            # aiocqhttp 先通知 message.group 的订阅者(多路复用), 再通知 message 的订阅者(nonebot -> msghandler)
+            start = perf_counter()
+            if mux.funcs:
+                await mux.dispatch(ev)
+                mux_samples.append(perf_counter() - start)
+            try:
+                await msghandler.handle_message(bot, ev, None)
+            except CanceledException:
+                pass
+            elapsed = perf_counter() - start
+            total.append(elapsed)
+            by_kind[kind].append(elapsed)
+            await asyncio.sleep(0)  # 让执行器中排队的函数体得以运行
+        while executor.depth or executor.waiting or executor.running:
+            await asyncio.sleep(0)
+        wall = perf_counter() - begin
+    finally:
+        metrics.observe_stage = observe_stage
+
+    ms = lambda x: f'{x * 1000:8.3f}ms'
+    print(f'modules: {", ".join(sorted(hoshino.config.MODULES_ON))}')
+    print(f'messages: {n}  groups: {groups}  handled: {len(handled_ids)}  '
+          f'completed: {executor.completed}  dropped: {sum(executor.dropped.values())}')
+    print(f'throughput: {n / wall:,.0f} msg/s')
+    print(f'{"":<18}{"p50":>10}{"p99":>10}{"count":>8}')
+    print(f'{"dispatch":<18}{ms(percentile(total, .5))}{ms(percentile(total, .99))}{len(total):>8}')
+    if mux_samples:
+        print(f'{"  on_message":<18}{ms(percentile(mux_samples, .5))}{ms(percentile(mux_samples, .99))}{len(mux_samples):>8}')
+    for stage, samples in stage_samples.items():
+        print(f'{"  " + stage:<18}{ms(percentile(samples, .5))}{ms(percentile(samples, .99))}{len(samples):>8}')
+    for kind, samples in sorted(by_kind.items()):
+        print(f'{"  msg:" + kind:<18}{ms(percentile(samples, .5))}{ms(percentile(samples, .99))}{len(samples):>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HoshinoBot dispatch benchmark')
+    parser.add_argument('-n', type=int, default=20000, help='number of synthetic messages')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--groups', type=int, default=50, help='number of distinct group ids')
+    parser.add_argument('--log', action='store_true', help='keep INFO logs of dispatch (muted by default)')
+    args = parser.parse_args()
+    hoshino.init()
+    if not args.log:
+        logging.disable(logging.INFO)
+    asyncio.run(run(args.n, args.seed, args.groups))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+from time import perf_counter
 
 import nonebot
 from nonebot.message import CanceledException
@@ -8,11 +9,13 @@ HoshinoBot = nonebot.NoneBot
 
 from . import log, config, util
 from .service import Service, sucmd
+from . import accounts
 
 __version__ = '2.2.0'
 
 _bot = None
 os.makedirs(os.path.expanduser('~/.hoshino'), exist_ok=True)
+log.configure(getattr(config, 'LOG_FORMAT', 'text'), getattr(config, 'LOG_RATE_LIMIT', None))
 logger = log.new_logger('hoshino', config.DEBUG)
 
 def init() -> HoshinoBot:
@@ -23,20 +26,42 @@ def init() -> HoshinoBot:
     _bot.get_self_ids = get_self_ids
     _bot.silence = util.silence
 
-    from .log import error_handler, critical_handler
-    nonebot.logger.addHandler(error_handler)
-    nonebot.logger.addHandler(critical_handler)
+    from . import grouplist, members, outbound
+    grouplist.install(_bot)
+    members.install(_bot)
+    outbound.install(_bot)
 
+    # nonebot 的日志也改经日志队列输出
+    nonebot.logger.removeHandler(nonebot.log.default_handler)
+    log.attach(nonebot.logger)
+
+    report = []
     for module_name in config.MODULES_ON:
-        nonebot.load_plugins(
+        start = perf_counter()
+        plugins = nonebot.load_plugins(
             os.path.join(os.path.dirname(__file__), 'modules', module_name),
             f'hoshino.modules.{module_name}')
+        report.append((module_name, len(plugins), perf_counter() - start))
 
-    from . import msghandler
+    from . import metrics, msghandler, trigger
+    start = perf_counter()
+    for t in trigger.chain:
+        t.compile()
+    metrics.mount(_bot.asgi)
+    report.append(('<triggers>', len(trigger.chain), perf_counter() - start))
+    _log_startup_report(report)
 
     return _bot
 
 
+def _log_startup_report(report):
+    report.sort(key=lambda x: x[2], reverse=True)
+    lines = [f'{"module":<20}{"n":>4} {"time":>11}']
+    lines.extend(f'{name:<20}{n:>4} {t * 1000:9.1f}ms' for name, n, t in report)
+    total = sum(t for _, _, t in report)
+    logger.info(f'Startup import/init time: {total * 1000:.1f}ms\n' + '\n'.join(lines))
+
+
 async def _finish(event, message, **kwargs):
     if message:
         await _bot.send(event, message, **kwargs)
@@ -50,6 +75,7 @@ def get_bot() -> HoshinoBot:
 
 
 def get_self_ids():
+    """已连接的账号(int), 可用且负载低的在前"""
     if _bot is None:
         raise ValueError('HoshinoBot has not been initialized')
-    return _bot._wsr_api_clients.keys()
+    return accounts.router.rank(int(sid) for sid in _bot._wsr_api_clients)
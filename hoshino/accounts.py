@@ -0,0 +1,120 @@
+"""多账号路由
+
+同一个群里有多个 bot 账号时, 按各账号近况挑选发送者, 而不是随机选一个:
+
+- 记录每个账号最近`ACCOUNT_RATE_WINDOW`秒内的发送量、进行中的请求数与请求耗时的滑动平均
+- 连续失败`ACCOUNT_FAILURE_THRESHOLD`次的账号暂停使用`ACCOUNT_COOLDOWN`秒, 之后的一次成功即恢复
+- `pick`从可用账号中选负载最低的, 换号重试由调用方(如`hoshino.broadcast`)负责
+
+路由只决定候选账号的先后, 哪些账号已连接仍由调用方给出(如`hoshino.get_self_ids`), 不依赖具体的连接方式.
+self_id 一律按 int 记录: 事件中的`self_id`是 int, 而`_wsr_api_clients`的键是 str, 两者指同一个账号.
+"""
+
+import random
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from time import monotonic
+
+from hoshino import config, log, metrics
+from hoshino.typing import CQHttpError, Deque, Dict, Iterable, List
+
+logger = log.new_logger('accounts', config.DEBUG)
+
+
+class AccountStats:
+    __slots__ = ('sends', 'inflight', 'latency_avg', 'failures', 'cooldown_until', 'total', 'errors')
+
+    def __init__(self):
+        self.sends: Deque[float] = deque()  # 最近的请求时刻
+        self.inflight = 0
+        self.latency_avg = 0.0
+        self.failures = 0                   # 连续失败次数
+        self.cooldown_until = 0.0
+        self.total = 0
+        self.errors = 0
+
+
+class AccountRouter:
+
+    def __init__(self, failure_threshold=3, cooldown=60.0, rate_window=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.rate_window = rate_window
+        self._stats: Dict[int, AccountStats] = defaultdict(AccountStats)
+
+    def healthy(self, self_id: int) -> bool:
+        return self._stats[int(self_id)].cooldown_until <= monotonic()
+
+    def rate(self, self_id: int) -> int:
+        """最近`rate_window`秒内的请求数"""
+        sends = self._stats[int(self_id)].sends
+        horizon = monotonic() - self.rate_window
+        while sends and sends[0] < horizon:
+            sends.popleft()
+        return len(sends)
+
+    def _load(self, self_id: int):
+        st = self._stats[self_id]
+        return (self.rate(self_id) + st.inflight, st.latency_avg)
+
+    def rank(self, self_ids: Iterable[int]) -> List[int]:
+        """可用的账号按负载由低到高排在前, 暂停使用的按恢复时间排在后"""
+        self_ids = [int(sid) for sid in self_ids]
+        random.shuffle(self_ids)    # 负载相同的账号轮流使用
+        now = monotonic()
+        ok = [sid for sid in self_ids if self._stats[sid].cooldown_until <= now]
+        ok.sort(key=self._load)
+        rest = [sid for sid in self_ids if self._stats[sid].cooldown_until > now]
+        rest.sort(key=lambda sid: self._stats[sid].cooldown_until)
+        return ok + rest
+
+    def pick(self, self_ids: Iterable[int]) -> int:
+        return self.rank(self_ids)[0]
+
+    @contextmanager
+    def track(self, self_id: int):
+        """记录在`with`块中以`self_id`发出的一次请求, `CQHttpError`计为失败"""
+        self_id = int(self_id)
+        st = self._stats[self_id]
+        start = monotonic()
+        st.sends.append(start)
+        st.inflight += 1
+        st.total += 1
+        try:
+            yield
+        except CQHttpError:
+            st.errors += 1
+            st.failures += 1
+            if st.failures >= self.failure_threshold and st.cooldown_until <= monotonic():
+                st.cooldown_until = monotonic() + self.cooldown
+                logger.warning(f'bot{self_id} 连续{st.failures}次请求失败，暂停使用{self.cooldown}秒')
+            raise
+        else:
+            st.failures = 0
+            st.cooldown_until = 0.0
+        finally:
+            st.inflight -= 1
+            st.latency_avg += (monotonic() - start - st.latency_avg) * 0.2
+
+    def collect(self) -> List[str]:
+        lines = []
+        for name, kind, value in (
+            ('healthy', 'gauge', lambda sid, st: int(self.healthy(sid))),
+            ('inflight', 'gauge', lambda sid, st: st.inflight),
+            ('recent_requests', 'gauge', lambda sid, st: self.rate(sid)),
+            ('latency_seconds_avg', 'gauge', lambda sid, st: st.latency_avg),
+            ('requests_total', 'counter', lambda sid, st: st.total),
+            ('errors_total', 'counter', lambda sid, st: st.errors),
+        ):
+            lines.append(f'# TYPE hoshino_account_{name} {kind}')
+            for sid, st in list(self._stats.items()):
+                lines.append(f'hoshino_account_{name}{metrics._labels(self_id=sid)} {value(sid, st)}')
+        return lines
+
+
+router = AccountRouter(
+    failure_threshold=getattr(config, 'ACCOUNT_FAILURE_THRESHOLD', 3),
+    cooldown=getattr(config, 'ACCOUNT_COOLDOWN', 60.0),
+    rate_window=getattr(config, 'ACCOUNT_RATE_WINDOW', 60.0),
+)
+metrics.collectors.append(router.collect)
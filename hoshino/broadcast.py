@@ -0,0 +1,171 @@
+"""广播引擎
+
+旧的`Service.broadcast`逐群串行投递, 每条消息前都等待`interval_time`, 上千个群的推送要花十几分钟.
+这里各群并发投递:
+
+- 同一群的多条消息按顺序发送, 相邻两条至少间隔`interval_time`秒
+- 同时投递中的群数至多`BROADCAST_CONCURRENCY`个
+
+本模块不另行限速, 消息经`hoshino.outbound`发出, 由其每群与每账号的令牌桶统一控制速率, 且不与其他消息合并.
+
+每条消息由群内负载最低的账号发送(见`hoshino.accounts`). 发送遇到`ActionFailed`时先换用群内其他账号,
+都失败过后按指数退避重试, 仍失败则放弃该群余下的消息.
+投递期间每隔`BROADCAST_REPORT_INTERVAL`秒报告一次进度与吞吐, 结束时报告汇总.
+"""
+
+import asyncio
+import random
+from collections import defaultdict
+from time import monotonic
+
+from aiocqhttp.exceptions import ActionFailed
+
+from hoshino import config, log, metrics, outbound
+from hoshino.accounts import router
+from hoshino.typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = log.new_logger('broadcast', config.DEBUG)
+
+
+class BroadcastStats:
+    __slots__ = ('tag', 'groups', 'done', 'sent', 'retried', 'failures', 'start', 'end')
+
+    def __init__(self, tag: str, groups: int):
+        self.tag = tag
+        self.groups = groups
+        self.done = 0       # 已结束投递的群数, 含失败
+        self.sent = 0       # 已成功发出的消息条数
+        self.retried = 0
+        self.failures: Dict[int, Exception] = {}   # {group_id: 最后一次的异常}
+        self.start = monotonic()
+        self.end = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end or monotonic()) - self.start
+
+    @property
+    def throughput(self) -> float:
+        """每秒发出的消息条数"""
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def progress(self) -> str:
+        return (f'{self.tag} 投递中 {self.done}/{self.groups}群 已发{self.sent}条 '
+                f'{self.throughput:.1f}条/秒 失败{len(self.failures)}群')
+
+    def summary(self) -> str:
+        return (f'{self.tag} 投递完成 成功{self.done - len(self.failures)}/{self.groups}群 共{self.sent}条 '
+                f'用时{self.elapsed:.1f}秒 {self.throughput:.1f}条/秒 重试{self.retried}次 失败{len(self.failures)}群')
+
+
+class Broadcaster:
+
+    def __init__(self, concurrency=16, retries=2, backoff=1.0, report_interval=10.0):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.report_interval = report_interval
+        self.active = 0
+        self.messages: Dict[Tuple[str, str], int] = defaultdict(int)   # {(service, result): count}
+
+    async def send(self, self_ids: List[int], group_id: int, message, name='', stats: BroadcastStats = None):
+        """由`self_ids`中负载最低的账号发送一条群消息, 速率由`hoshino.outbound`控制
+
+        `ActionFailed`时先换用群内其他账号, 都失败过后退避重试, 重试用尽后抛出最后的异常
+        """
+        failed = set()
+        for attempt in range(self.retries + 1):
+            self_id = router.pick([sid for sid in self_ids if sid not in failed] or self_ids)
+            try:
+                await outbound.pipeline.send_group_msg(self_id=self_id, group_id=group_id, message=message, coalesce=False)
+            except ActionFailed:
+                if attempt == self.retries:
+                    self.messages[(name, 'failed')] += 1
+                    raise
+                self.messages[(name, 'retried')] += 1
+                if stats:
+                    stats.retried += 1
+                failed.add(self_id)
+                if len(failed) >= len(set(self_ids)):
+                    failed.clear()
+                    await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+            except Exception:
+                self.messages[(name, 'failed')] += 1
+                raise
+            else:
+                self.messages[(name, 'sent')] += 1
+                if stats:
+                    stats.sent += 1
+                return
+
+    async def _deliver(self, group_id, self_ids: List[int], msgs, interval, randomiser, name,
+                       stats: BroadcastStats, sem: asyncio.Semaphore, log_to):
+        async with sem:
+            try:
+                for i, msg in enumerate(msgs):
+                    if i and interval:
+                        await asyncio.sleep(interval)
+                    msg = randomiser(msg) if randomiser else msg
+                    await self.send(self_ids, group_id, msg, name, stats)
+                log_to.debug(f'群{group_id} 投递{stats.tag}成功 共{len(msgs)}条消息')
+            except ActionFailed as e:
+                stats.failures[group_id] = e
+                log_to.error(f'群{group_id} 投递{stats.tag}失败：{e}')
+            except Exception as e:
+                stats.failures[group_id] = e
+                log_to.error(f'群{group_id} 投递{stats.tag}失败：{type(e)}')
+                log_to.exception(e)
+            finally:
+                stats.done += 1
+
+    async def _report(self, stats: BroadcastStats, log_to):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            log_to.info(stats.progress())
+
+    async def broadcast(self, groups: Dict[int, List[int]], msgs: Iterable, tag='', interval=0.0,
+                        randomiser: Optional[Callable] = None, name='', log_to=logger) -> BroadcastStats:
+        """向`groups`({group_id: [可用的self_id]})并发投递`msgs`
+
+        @param name: 发起广播的服务名, 用于统计
+        @return: 本次投递的统计
+        """
+        msgs = list(msgs)
+        stats = BroadcastStats(tag, len(groups))
+        if not groups or not msgs:
+            stats.end = monotonic()
+            return stats
+        sem = asyncio.Semaphore(self.concurrency)
+        reporter = asyncio.ensure_future(self._report(stats, log_to)) if self.report_interval else None
+        self.active += 1
+        try:
+            await asyncio.gather(*(
+                self._deliver(gid, sids, msgs, interval, randomiser, name, stats, sem, log_to)
+                for gid, sids in groups.items()
+            ))
+        finally:
+            self.active -= 1
+            if reporter:
+                reporter.cancel()
+            stats.end = monotonic()
+        log_to.info(stats.summary())
+        return stats
+
+    def collect(self) -> List[str]:
+        lines = [
+            '# TYPE hoshino_broadcast_active gauge',
+            f'hoshino_broadcast_active {self.active}',
+            '# TYPE hoshino_broadcast_messages_total counter',
+        ]
+        for (name, result), n in list(self.messages.items()):
+            lines.append(f'hoshino_broadcast_messages_total{metrics._labels(service=name, result=result)} {n}')
+        return lines
+
+
+broadcaster = Broadcaster(
+    concurrency=getattr(config, 'BROADCAST_CONCURRENCY', 16),
+    retries=getattr(config, 'BROADCAST_RETRIES', 2),
+    backoff=getattr(config, 'BROADCAST_BACKOFF', 1.0),
+    report_interval=getattr(config, 'BROADCAST_REPORT_INTERVAL', 10.0),
+)
+metrics.collectors.append(broadcaster.collect)
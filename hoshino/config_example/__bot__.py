@@ -26,6 +26,42 @@ RES_DIR = r'./res/'
 # 使用http协议时需填写，原则上该url应指向RES_DIR目录
 RES_URL = 'http://127.0.0.1:5000/static/'
 
+# 消息处理的并发控制：同一群内的消息按顺序处理，不同群之间并发处理
+DISPATCH_CONCURRENCY = 32           # 同时处理消息的群数上限
+DISPATCH_QUEUE_SIZE = 20            # 每个群排队等待处理的消息数上限
+DISPATCH_OVERFLOW = 'drop_oldest'   # 队列满时：drop_oldest丢弃最早的消息，drop_new丢弃新消息，block等待
+# 高负载时按服务优先级舍弃消息：排队总数或平均等待时间超过阈值时舍弃best_effort服务，超过两倍时再舍弃normal服务
+DISPATCH_SHED_DEPTH = 200           # 排队消息总数阈值
+DISPATCH_SHED_LATENCY = 2.0         # 平均等待并发名额的时间阈值（秒），不含排在本群其他消息之后的时间
+
+# 广播（推送到所有启用服务的群）：各群并发投递，发送速率由下方的OUTBOUND_*统一限制
+BROADCAST_CONCURRENCY = 16          # 同时投递的群数上限
+BROADCAST_RETRIES = 2               # 发送失败（ActionFailed）时的重试次数，每次重试前等待时间加倍
+BROADCAST_BACKOFF = 1.0             # 第一次重试前的等待时间（秒）
+BROADCAST_REPORT_INTERVAL = 10.0    # 投递进度的报告间隔（秒），0不报告
+
+# 出站群消息：每个群、每个bot账号分别限速，连续回复会自动放缓，无需在插件中sleep
+OUTBOUND_GROUP_RATE = 1.0           # 每个群每秒至多发送的消息数
+OUTBOUND_GROUP_BURST = 5            # 每个群允许的突发消息数
+OUTBOUND_ACCOUNT_RATE = 10.0        # 每个bot账号每秒至多发送的群消息数（含广播）
+OUTBOUND_ACCOUNT_BURST = 20         # 每个bot账号允许的突发消息数
+OUTBOUND_COALESCE_WINDOW = 0.05     # 同一群排队中的短文本合并为一条发送，短文本发出前最多等待的时间（秒）
+OUTBOUND_COALESCE_MAX_LEN = 200     # 参与合并的文本长度上限，合并后的长度也不超过此值
+
+# 多账号：同一群内有多个bot账号时，由负载最低且可用的账号发送
+ACCOUNT_FAILURE_THRESHOLD = 3       # 账号连续请求失败若干次后暂停使用
+ACCOUNT_COOLDOWN = 60.0             # 暂停使用的时间（秒）
+ACCOUNT_RATE_WINDOW = 60.0          # 统计账号发送量的时间窗口（秒）
+
+GROUP_LIST_TTL = 600.0              # bot所在群列表的缓存时间（秒），入群退群时会即时更新
+GROUP_LIST_RETRY = 30.0             # 群列表获取失败时沿用旧缓存，并在此时间（秒）内不再重试
+GROUP_MEMBER_TTL = 1800.0           # 群成员信息的缓存时间（秒），成员变动的通知会使其即时失效
+GROUP_MEMBER_MAX_SIZE = 50000       # 缓存的群成员信息条数上限
+
+# 日志
+LOG_FORMAT = 'text'     # 输出格式：text为普通文本，json为每行一条JSON
+LOG_RATE_LIMIT = None   # 重复日志限流：(条数, 秒)表示同一位置的日志每若干秒至多输出若干条，None不限流
+
 
 # 启用的模块
 # 初次尝试部署时请先保持默认
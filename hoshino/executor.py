@@ -0,0 +1,240 @@
+"""消息处理的执行器
+
+同一个群的消息按到达顺序串行处理, 不同群之间并发处理, 并发的群数受全局上限约束.
+每个群有一个有界队列, 队列满时先挤掉队列中优先级低于新消息的最早一条,
+没有可挤掉的才按`overflow`处理:
+
+- `drop_oldest`: 丢弃队列中最早的一条
+- `drop_new`: 丢弃新到达的一条
+- `block`: 等待队列出现空位 (会阻塞该连接上后续事件的接收)
+
+服务按优先级分为`critical`, `normal`, `best_effort`三类. 排队总数或等待并发名额的时间超过阈值时
+先舍弃`best_effort`, 超过两倍阈值时再舍弃`normal`, `critical`永不舍弃.
+等待时间只计出队后等待全局并发名额的部分, 排在本群慢任务之后的时间不计入, 个别群的积压不会波及其他群.
+已在队列中的消息出队时同样按当时的负载判断, 因此高峰期积压的低优先级消息会被跳过.
+"""
+
+import asyncio
+from collections import defaultdict, deque
+from time import perf_counter
+
+from hoshino import config, log, metrics
+from hoshino.typing import Awaitable, Callable, Deque, Dict, List, Set, Tuple
+
+logger = log.new_logger('executor', config.DEBUG)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_new', 'block')
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+BEST_EFFORT = 'best_effort'
+PRIORITIES = (CRITICAL, NORMAL, BEST_EFFORT)
+_RANK = {p: i for i, p in enumerate(PRIORITIES)}
+
+
+class _Job:
+    __slots__ = ('run', 'on_drop', 'priority', 'tag', 'enqueued')
+
+    def __init__(self, run, on_drop, priority, tag):
+        self.run = run
+        self.on_drop = on_drop
+        self.priority = priority
+        self.tag = tag
+        self.enqueued = perf_counter()
+
+
+class _GroupQueue:
+    __slots__ = ('jobs', 'putters')
+
+    def __init__(self):
+        self.jobs: Deque[_Job] = deque()
+        self.putters: Deque[asyncio.Future] = deque()   # overflow 为 block 时等待空位的 submit
+
+
+class DispatchExecutor:
+
+    def __init__(self, concurrency=32, queue_size=20, overflow='drop_oldest', shed_depth=200, shed_latency=2.0):
+        assert overflow in OVERFLOW_POLICIES, f'overflow should be one of {OVERFLOW_POLICIES}'
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.shed_depth = shed_depth
+        self.shed_latency = shed_latency
+        self._sem = None
+        self._queues: Dict[int, _GroupQueue] = {}
+        self._workers: Set[asyncio.Future] = set()  # 持有 worker 的引用, 以免被回收
+        self.depth = 0                      # 全部群排队中的消息总数
+        self.running = 0
+        self.waiting = 0                    # 已出队、正等待并发名额的消息数
+        self.completed = 0
+        self.wait_avg = 0.0                 # 等待并发名额时间的指数滑动平均
+        self.dropped = defaultdict(int)     # {reason: count}
+        self.shed: Dict[Tuple[str, str], int] = defaultdict(int)    # {(tag, priority): count}
+        self.max_depth = 0
+        self.wait_time = metrics.Histogram()
+
+    def group_depth(self, group_id) -> int:
+        q = self._queues.get(group_id)
+        return len(q.jobs) if q else 0
+
+    def load_level(self) -> int:
+        """@return: 0 正常; 1 舍弃 best_effort; 2 同时舍弃 normal"""
+        if not self.depth and not self.waiting:
+            return 0    # 没有积压时滑动平均可能已过时, 不作参考
+        if self.depth >= 2 * self.shed_depth or self.wait_avg >= 2 * self.shed_latency:
+            return 2
+        if self.depth >= self.shed_depth or self.wait_avg >= self.shed_latency:
+            return 1
+        return 0
+
+    def admit(self, priority=NORMAL, tag='') -> bool:
+        """按当前负载判断是否受理`priority`级别的任务, 不受理时计入舍弃数
+
+        不经过队列的处理函数(如`on_message`)也应先询问此处
+        """
+        if _RANK[priority] + self.load_level() >= len(PRIORITIES):
+            self.shed[(tag, priority)] += 1
+            return False
+        return True
+
+    async def submit(self, group_id, run: Callable[[], Awaitable], on_drop: Callable[[str], None] = None,
+                     priority=NORMAL, tag='') -> bool:
+        """将`run()`排入本群的队列, 被丢弃时以原因(`overflow`或`shed`)调用`on_drop`
+
+        @return: 是否成功排入; 因负载过高被舍弃或因队列已满被丢弃时返回 False
+        """
+        if not self.admit(priority, tag):
+            self._drop(_Job(run, on_drop, priority, tag), 'shed')
+            return False
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        q = self._queues.get(group_id)
+        new_worker = q is None
+        if new_worker:
+            q = self._queues[group_id] = _GroupQueue()
+        job = _Job(run, on_drop, priority, tag)
+        if len(q.jobs) >= self.queue_size:
+            victim = self._pick_victim(q.jobs, job)
+            if victim is not None:
+                q.jobs.remove(victim)
+                self.depth -= 1
+                self._drop(victim, 'overflow')
+            elif self.overflow == 'drop_new':
+                self._drop(job, 'overflow')
+                return False
+            elif self.overflow == 'drop_oldest':
+                self.depth -= 1
+                self._drop(q.jobs.popleft(), 'overflow')
+            else:
+                while len(q.jobs) >= self.queue_size:
+                    fut = asyncio.get_event_loop().create_future()
+                    q.putters.append(fut)
+                    await fut
+                    # 等待期间 worker 可能已取空队列并退出, 之后的 submit 又建立了新的队列与 worker;
+                    # 总是排入本群当前的队列, 只在队列不存在时才新建 worker, 以保持同群串行
+                    q = self._queues.get(group_id)
+                    if q is None:
+                        q = self._queues[group_id] = _GroupQueue()
+                        new_worker = True
+        q.jobs.append(job)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, len(q.jobs))
+        if new_worker:
+            worker = asyncio.ensure_future(self._worker(group_id, q))
+            self._workers.add(worker)
+            worker.add_done_callback(self._reap)
+        return True
+
+    def _reap(self, worker: asyncio.Future):
+        self._workers.discard(worker)
+        if not worker.cancelled() and worker.exception() is not None:
+            logger.error('Dispatch worker exited with an exception', exc_info=worker.exception())
+
+    @staticmethod
+    def _pick_victim(jobs: Deque[_Job], job: _Job):
+        """队列中优先级最低且低于`job`的最早一项"""
+        victim = None
+        for j in jobs:
+            if _RANK[j.priority] > _RANK[job.priority] and (victim is None or _RANK[j.priority] > _RANK[victim.priority]):
+                victim = j
+        return victim
+
+    def _drop(self, job: _Job, reason: str):
+        if reason != 'shed':    # 舍弃数已在 admit 中按服务计入
+            self.dropped[reason] += 1
+        if job.on_drop:
+            try:
+                job.on_drop(reason)
+            except Exception as e:
+                logger.exception(e)
+
+    async def _worker(self, group_id, q: _GroupQueue):
+        try:
+            while q.jobs:
+                job = q.jobs.popleft()
+                self.depth -= 1
+                if q.putters:
+                    fut = q.putters.popleft()
+                    if not fut.done():
+                        fut.set_result(None)
+                start = perf_counter()
+                self.wait_time.observe(start - job.enqueued)
+                if not self.admit(job.priority, job.tag):
+                    self._drop(job, 'shed')  # 积压期间排到的低优先级消息直接跳过
+                    continue
+                self.waiting += 1
+                try:
+                    await self._sem.acquire()
+                finally:
+                    self.waiting -= 1
+                self.wait_avg += (perf_counter() - start - self.wait_avg) * 0.1
+                self.running += 1
+                try:
+                    await job.run()
+                except Exception as e:
+                    logger.exception(e)
+                finally:
+                    self.running -= 1
+                    self.completed += 1
+                    self._sem.release()
+        finally:
+            # 队列空了就回收, 之后的新消息会重新建立队列与 worker
+            if self._queues.get(group_id) is q:
+                del self._queues[group_id]
+
+    def collect(self) -> List[str]:
+        lines = [
+            '# TYPE hoshino_dispatch_queue_depth gauge',
+            f'hoshino_dispatch_queue_depth {self.depth}',
+            '# TYPE hoshino_dispatch_queue_max_depth gauge',
+            f'hoshino_dispatch_queue_max_depth {self.max_depth}',
+            '# TYPE hoshino_dispatch_active_groups gauge',
+            f'hoshino_dispatch_active_groups {len(self._queues)}',
+            '# TYPE hoshino_dispatch_running gauge',
+            f'hoshino_dispatch_running {self.running}',
+            '# TYPE hoshino_dispatch_waiting gauge',
+            f'hoshino_dispatch_waiting {self.waiting}',
+            '# TYPE hoshino_dispatch_load_level gauge',
+            f'hoshino_dispatch_load_level {self.load_level()}',
+            '# TYPE hoshino_dispatch_completed_total counter',
+            f'hoshino_dispatch_completed_total {self.completed}',
+            '# TYPE hoshino_dispatch_dropped_total counter',
+        ]
+        for reason, n in list(self.dropped.items()):
+            lines.append(f'hoshino_dispatch_dropped_total{metrics._labels(reason=reason)} {n}')
+        lines.append('# TYPE hoshino_dispatch_shed_total counter')
+        for (tag, priority), n in list(self.shed.items()):
+            lines.append(f'hoshino_dispatch_shed_total{metrics._labels(service=tag, priority=priority)} {n}')
+        lines.append('# TYPE hoshino_dispatch_queue_wait_seconds histogram')
+        metrics._render_histogram(lines, 'hoshino_dispatch_queue_wait_seconds', self.wait_time)
+        return lines
+
+
+executor = DispatchExecutor(
+    concurrency=getattr(config, 'DISPATCH_CONCURRENCY', 32),
+    queue_size=getattr(config, 'DISPATCH_QUEUE_SIZE', 20),
+    overflow=getattr(config, 'DISPATCH_OVERFLOW', 'drop_oldest'),
+    shed_depth=getattr(config, 'DISPATCH_SHED_DEPTH', 200),
+    shed_latency=getattr(config, 'DISPATCH_SHED_LATENCY', 2.0),
+)
+metrics.collectors.append(executor.collect)
@@ -0,0 +1,132 @@
+"""bot 账号的群列表缓存
+
+广播、`get_enable_groups`及各管理指令都需要每个账号所在的群, 不必每次都调用`get_group_list`:
+
+- 每个账号的群列表缓存`GROUP_LIST_TTL`秒, 过期后的第一次访问才重新拉取
+- 同一账号同时只有一个拉取请求, 并发的访问共享其结果
+- 拉取失败时若有过期的缓存则沿用, 并记录警告; 之后`GROUP_LIST_RETRY`秒内继续沿用, 不再重试
+- bot 入群/退群/被踢的通知及同意入群邀请时直接增删缓存中的群, 不必等待过期
+
+self_id 一律按 int 存储: 通知中的`ev.self_id`是 int, 而`_wsr_api_clients`的键是 str.
+"""
+
+import asyncio
+from collections import defaultdict
+from time import monotonic
+
+import hoshino
+from hoshino import config, log, metrics
+from hoshino.typing import CQEvent, CQHttpError, Dict, List, Tuple
+
+logger = log.new_logger('grouplist', config.DEBUG)
+
+
+class GroupListCache:
+
+    def __init__(self, ttl=600.0, retry=30.0):
+        self.ttl = ttl
+        self.retry = retry
+        self._entries: Dict[int, Tuple[float, Dict[int, dict]]] = {}   # {self_id: (过期时间, {group_id: group_info})}
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.requests: Dict[str, int] = defaultdict(int)    # {result: count}
+
+    async def get(self, self_id: int, refresh=False) -> Dict[int, dict]:
+        """@return: {group_id: group_info}, 请勿修改"""
+        self_id = int(self_id)
+        entry = self._entries.get(self_id)
+        if entry and not refresh and entry[0] > monotonic():
+            self.requests['hit'] += 1
+            return entry[1]
+        fut = self._inflight.get(self_id)
+        if fut is None:
+            self.requests['miss'] += 1
+            fut = self._inflight[self_id] = asyncio.ensure_future(self._fetch(self_id))
+            fut.add_done_callback(lambda _: self._inflight.pop(self_id, None))
+        else:
+            self.requests['coalesced'] += 1
+        return await asyncio.shield(fut)
+
+    async def _fetch(self, self_id: int) -> Dict[int, dict]:
+        try:
+            gl = await hoshino.get_bot().get_group_list(self_id=self_id)
+        except CQHttpError as e:
+            entry = self._entries.get(self_id)
+            if entry is None:
+                raise
+            logger.warning(f'bot{self_id} 获取群列表失败，沿用过期的缓存，{self.retry}秒后重试：{type(e)}')
+            self._entries[self_id] = (monotonic() + self.retry, entry[1])
+            return entry[1]
+        groups = {g['group_id']: g for g in gl}
+        self._entries[self_id] = (monotonic() + self.ttl, groups)
+        return groups
+
+    def add(self, self_id: int, group_id: int, info: dict = None):
+        entry = self._entries.get(int(self_id))
+        if entry:
+            entry[1][group_id] = info or entry[1].get(group_id) or {'group_id': group_id, 'group_name': ''}
+
+    def remove(self, self_id: int, group_id: int):
+        entry = self._entries.get(int(self_id))
+        if entry:
+            entry[1].pop(group_id, None)
+
+    def invalidate(self, self_id: int = None):
+        if self_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(int(self_id), None)
+
+    async def _fill_info(self, self_id: int, group_id: int):
+        try:
+            info = await hoshino.get_bot().get_group_info(self_id=self_id, group_id=group_id)
+        except CQHttpError as e:
+            logger.warning(f'bot{self_id} 获取群{group_id}信息失败：{type(e)}')
+            return
+        if group_id in (self._entries.get(self_id) or (0, {}))[1]:
+            self.add(self_id, group_id, info)
+
+    async def on_notice(self, ev: CQEvent):
+        if ev.user_id != ev.self_id:
+            return
+        if ev.notice_type == 'group_increase':
+            self.add(ev.self_id, ev.group_id)
+            asyncio.ensure_future(self._fill_info(ev.self_id, ev.group_id))
+        elif ev.notice_type == 'group_decrease':    # leave 或 kick_me
+            self.remove(ev.self_id, ev.group_id)
+
+    def collect(self) -> List[str]:
+        lines = ['# TYPE hoshino_group_list_requests_total counter']
+        for result, n in list(self.requests.items()):
+            lines.append(f'hoshino_group_list_requests_total{metrics._labels(result=result)} {n}')
+        return lines
+
+
+cache = GroupListCache(
+    ttl=getattr(config, 'GROUP_LIST_TTL', 600.0),
+    retry=getattr(config, 'GROUP_LIST_RETRY', 30.0),
+)
+metrics.collectors.append(cache.collect)
+
+
+def install(bot):
+    """在 bot 上注册群成员变动的通知, 由`hoshino.init`调用"""
+    bot.on('notice.group_increase', 'notice.group_decrease')(cache.on_notice)
+
+
+async def get_group_list(self_id: int, refresh=False) -> List[dict]:
+    """与`bot.get_group_list(self_id=self_id)`相同, 但使用缓存"""
+    return list((await cache.get(self_id, refresh)).values())
+
+
+async def get_groups(refresh=False) -> Dict[int, List[int]]:
+    """@return: {group_id: [所在的self_id]}, 获取失败的账号视为不在任何群中"""
+    groups = defaultdict(list)
+    for sid in hoshino.get_self_ids():
+        try:
+            sgl = await cache.get(sid, refresh)
+        except CQHttpError as e:
+            logger.error(f'bot{sid} 获取群列表失败：{type(e)}')
+            continue
+        for gid in sgl:
+            groups[gid].append(sid)
+    return groups
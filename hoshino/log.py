@@ -1,26 +1,135 @@
+"""日志
+
+各 logger 只挂一个`QueueHandler`, 调用方线程仅把记录放入队列;
+格式化与控制台/文件输出由`QueueListener`的后台线程完成, 磁盘卡顿不会阻塞事件循环.
+
+`configure()`可切换为 JSON 格式输出, 或对同一调用位置的重复日志限流.
+"""
+
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from time import monotonic
 
 os.makedirs('./log', exist_ok=True)
 _error_log_file = os.path.expanduser('./log/error.log')
 _critical_log_file = os.path.expanduser('./log/critical.log')
 
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, ensure_ascii=False)
+
+
 formatter = logging.Formatter('[%(asctime)s %(name)s] %(levelname)s: %(message)s')
+json_formatter = JsonFormatter()
+
+# 以下三个 handler 只在后台线程中使用, 不要直接挂到 logger 上
 default_handler = logging.StreamHandler(sys.stdout)
-default_handler.setFormatter(formatter)
 error_handler = logging.FileHandler(_error_log_file, encoding='utf8')
 error_handler.setLevel(logging.ERROR)
-error_handler.setFormatter(formatter)
 critical_handler = logging.FileHandler(_critical_log_file, encoding='utf8')
 critical_handler.setLevel(logging.CRITICAL)
-critical_handler.setFormatter(formatter)
+_sinks = (default_handler, error_handler, critical_handler)
+for _h in _sinks:
+    _h.setFormatter(formatter)
+
+
+class RateLimitFilter(logging.Filter):
+    """同一调用位置每`interval`秒至多输出`burst`条, 超出的丢弃, 下个窗口的第一条附带丢弃的条数
+
+    ERROR 及以上级别不限流
+    """
+
+    def __init__(self, burst=20, interval=60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._windows = {}  # {(pathname, lineno): [窗口开始时间, 条数, 丢弃条数]}
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.pathname, record.lineno)
+        now = monotonic()
+        with self._lock:
+            w = self._windows.get(key)
+            if w is None or now - w[0] >= self.interval:
+                if w and w[2]:
+                    record.msg = f'{record.msg} (suppressed {w[2]} similar lines)'
+                self._windows[key] = [now, 1, 0]
+                return True
+            w[1] += 1
+            if w[1] <= self.burst:
+                return True
+            w[2] += 1
+            return False
+
+
+class _QueueHandler(QueueHandler):
+
+    def prepare(self, record):
+        # 参数与异常须在调用方线程中展开, 其余格式化留给后台线程
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_queue = queue.SimpleQueue()
+queue_handler = _QueueHandler(_queue)
+_listener = QueueListener(_queue, *_sinks, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)     # 退出前写完队列中剩余的日志
+_rate_limiter = None
+
+
+def configure(fmt='text', rate_limit=None):
+    """@param fmt: 'text' 或 'json'
+    @param rate_limit: (burst, interval), 为 None 时不限流
+    """
+    assert fmt in ('text', 'json'), "log format should be 'text' or 'json'"
+    global _rate_limiter
+    for h in _sinks:
+        h.setFormatter(json_formatter if fmt == 'json' else formatter)
+    if _rate_limiter:
+        queue_handler.removeFilter(_rate_limiter)
+        _rate_limiter = None
+    if rate_limit:
+        _rate_limiter = RateLimitFilter(*rate_limit)
+        queue_handler.addFilter(_rate_limiter)
+
+
+def attach(logger: logging.Logger):
+    """将`logger`接入日志队列, 重复调用无副作用"""
+    if queue_handler not in logger.handlers:
+        logger.addHandler(queue_handler)
 
 
 def new_logger(name, debug=True):
     logger = logging.getLogger(name)
-    logger.addHandler(default_handler)
-    logger.addHandler(error_handler)
-    logger.addHandler(critical_handler)
+    attach(logger)
     logger.setLevel(logging.DEBUG if debug else logging.INFO)
     return logger
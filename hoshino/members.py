@@ -0,0 +1,171 @@
+"""群成员信息缓存
+
+以 (self_id, group_id, user_id) 为键缓存`get_group_member_info`的结果, `GROUP_MEMBER_TTL`秒后过期:
+
+- `get_many`并发获取未命中的成员, 排行榜等场合不必逐个等待
+- `get_list`以一次`get_group_member_list`填充整个群, 同一个群同时只有一个拉取请求
+- 成员退群/入群/改名片/设管理员的通知会使相应的缓存失效;
+  失效的条目在清理前仍可经`peek`读取, 例如退群通知中显示退群者的名片
+- 条目超过`GROUP_MEMBER_MAX_SIZE`时先清理过期条目, 仍超出则淘汰最久未使用的, 一次清理到上限的九成
+
+self_id 一律按 int 存储: 通知中的`ev.self_id`是 int, 而`_wsr_api_clients`的键是 str.
+"""
+
+import asyncio
+from collections import OrderedDict, defaultdict
+from time import monotonic
+
+import hoshino
+from hoshino import config, log, metrics
+from hoshino.typing import CQEvent, CQHttpError, Dict, Iterable, List, Optional, Tuple
+
+logger = log.new_logger('members', config.DEBUG)
+
+_Key = Tuple[int, int, int]
+
+LOW_WATER = 0.9     # 超出上限时清理到上限的这一比例, 使清理的开销分摊到多次写入
+
+
+class MemberCache:
+
+    def __init__(self, ttl=1800.0, max_size=50000):
+        self.ttl = ttl
+        self.max_size = max_size
+        # {(self_id, group_id, user_id): (过期时间, member_info)}, 按最近使用排序, 最久未使用的在前
+        self._members: Dict[_Key, Tuple[float, dict]] = OrderedDict()
+        self._groups: Dict[Tuple[int, int], Dict[int, None]] = defaultdict(dict)   # {(self_id, group_id): {user_id}}
+        self._lists: Dict[Tuple[int, int], float] = {}         # 已整体填充的群 {(self_id, group_id): 过期时间}
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self.requests: Dict[str, int] = defaultdict(int)       # {result: count}
+
+    def _put(self, self_id, group_id, info: dict, expire: float):
+        key = (self_id, group_id, info['user_id'])
+        self._members[key] = (expire, info)
+        self._members.move_to_end(key)
+        self._groups[(self_id, group_id)][key[2]] = None
+        if len(self._members) > self.max_size:
+            self._evict()
+
+    def _remove(self, key: _Key):
+        del self._members[key]
+        group = self._groups[key[:2]]
+        del group[key[2]]
+        if not group:
+            del self._groups[key[:2]]
+        self._lists.pop(key[:2], None)  # 整体填充的群已缺失成员
+
+    def _evict(self):
+        now = monotonic()
+        for key in [k for k, (expire, _) in self._members.items() if expire <= now]:
+            self._remove(key)
+        low = int(self.max_size * LOW_WATER)
+        while len(self._members) > low:
+            self._remove(next(iter(self._members)))
+
+    def peek(self, self_id: int, group_id: int, user_id: int) -> Optional[dict]:
+        """不论是否过期, 返回缓存中的成员信息, 不发起请求"""
+        entry = self._members.get((int(self_id), group_id, user_id))
+        return entry[1] if entry else None
+
+    def _single_flight(self, key, make_coro):
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = self._inflight[key] = asyncio.ensure_future(make_coro())
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return asyncio.shield(fut)
+
+    async def get(self, self_id: int, group_id: int, user_id: int) -> dict:
+        """与`bot.get_group_member_info`相同, 但使用缓存; 获取失败时抛出`CQHttpError`"""
+        self_id = int(self_id)
+        key = (self_id, group_id, user_id)
+        entry = self._members.get(key)
+        if entry and entry[0] > monotonic():
+            self.requests['hit'] += 1
+            self._members.move_to_end(key)
+            return entry[1]
+        self.requests['miss'] += 1
+        return await self._single_flight((self_id, group_id, user_id), lambda: self._fetch(self_id, group_id, user_id))
+
+    async def _fetch(self, self_id, group_id, user_id) -> dict:
+        info = await hoshino.get_bot().get_group_member_info(self_id=self_id, group_id=group_id, user_id=user_id)
+        self._put(self_id, group_id, info, monotonic() + self.ttl)
+        return info
+
+    async def get_many(self, self_id: int, group_id: int, user_ids: Iterable[int]) -> Dict[int, Optional[dict]]:
+        """并发获取多个成员, 获取失败的成员为 None"""
+        user_ids = list(user_ids)
+        infos = await asyncio.gather(*(self.get(self_id, group_id, uid) for uid in user_ids), return_exceptions=True)
+        ret = {}
+        for uid, info in zip(user_ids, infos):
+            if isinstance(info, CQHttpError):
+                logger.warning(f'获取群{group_id}成员{uid}的信息失败：{type(info)}')
+                info = None
+            elif isinstance(info, BaseException):
+                raise info
+            ret[uid] = info
+        return ret
+
+    async def get_list(self, self_id: int, group_id: int) -> List[dict]:
+        """与`bot.get_group_member_list`相同, 但使用缓存; 获取失败时抛出`CQHttpError`"""
+        self_id = int(self_id)
+        expire = self._lists.get((self_id, group_id))
+        if expire and expire > monotonic():
+            self.requests['list_hit'] += 1
+            members = []
+            for uid in self._groups.get((self_id, group_id), ()):
+                key = (self_id, group_id, uid)
+                self._members.move_to_end(key)
+                members.append(self._members[key][1])
+            return members
+        self.requests['list_miss'] += 1
+        return await self._single_flight((self_id, group_id), lambda: self._fetch_list(self_id, group_id))
+
+    async def _fetch_list(self, self_id, group_id) -> List[dict]:
+        members = await hoshino.get_bot().get_group_member_list(self_id=self_id, group_id=group_id)
+        expire = monotonic() + self.ttl
+        self.invalidate(self_id, group_id)
+        self._lists[(self_id, group_id)] = expire   # 先于填充记录, 填充途中被淘汰的成员会使其失效
+        for info in members:
+            self._put(self_id, group_id, info, expire)
+        return members
+
+    def invalidate(self, self_id: int, group_id: int, user_id: int = None):
+        """使成员(`user_id`为 None 时为整个群)的缓存过期; 单个成员的信息在清理前仍可`peek`"""
+        self_id = int(self_id)
+        self._lists.pop((self_id, group_id), None)
+        if user_id is None:
+            for uid in list(self._groups.get((self_id, group_id), ())):
+                self._remove((self_id, group_id, uid))
+        else:
+            entry = self._members.get((self_id, group_id, user_id))
+            if entry:
+                self._members[(self_id, group_id, user_id)] = (0.0, entry[1])
+
+    async def on_notice(self, ev: CQEvent):
+        if ev.user_id == ev.self_id and ev.notice_type == 'group_decrease':
+            self.invalidate(ev.self_id, ev.group_id)    # bot 自己退群或被踢
+        else:
+            self.invalidate(ev.self_id, ev.group_id, ev.user_id)
+
+    def collect(self) -> List[str]:
+        lines = [
+            '# TYPE hoshino_group_member_cache_size gauge',
+            f'hoshino_group_member_cache_size {len(self._members)}',
+            '# TYPE hoshino_group_member_requests_total counter',
+        ]
+        for result, n in list(self.requests.items()):
+            lines.append(f'hoshino_group_member_requests_total{metrics._labels(result=result)} {n}')
+        return lines
+
+
+cache = MemberCache(
+    ttl=getattr(config, 'GROUP_MEMBER_TTL', 1800.0),
+    max_size=getattr(config, 'GROUP_MEMBER_MAX_SIZE', 50000),
+)
+metrics.collectors.append(cache.collect)
+
+
+def install(bot):
+    """在 bot 上注册群成员变动的通知, 由`hoshino.init`调用"""
+    bot.on('notice.group_increase', 'notice.group_decrease', 'notice.group_admin', 'notice.group_card')(cache.on_notice)
+
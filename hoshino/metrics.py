@@ -0,0 +1,117 @@
+"""轻量的运行指标统计
+
+记录每个 ServiceFunc 的触发次数、异常次数与耗时分布, 以及触发器链每个阶段的匹配耗时.
+`mount(app)`将其以 Prometheus 文本格式挂载到 bot.asgi 上, 默认路径为`/metrics`.
+"""
+
+import bisect
+from collections import defaultdict
+
+from hoshino.typing import Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一格为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        ret = []
+        acc = 0
+        for le, n in zip(self.buckets, self.counts):
+            acc += n
+            ret.append((repr(float(le)), acc))
+        ret.append(('+Inf', acc + self.counts[-1]))
+        return ret
+
+
+# {(service, func, kind): ...}, kind 为 message / on_message / scheduled_job
+handler_calls: Dict[Tuple[str, str, str], int] = defaultdict(int)
+handler_errors: Dict[Tuple[str, str, str], int] = defaultdict(int)
+handler_latency: Dict[Tuple[str, str, str], Histogram] = defaultdict(Histogram)
+# {stage: ...}
+stage_runs: Dict[str, int] = defaultdict(int)
+stage_hits: Dict[str, int] = defaultdict(int)
+stage_latency: Dict[str, Histogram] = defaultdict(lambda: Histogram(STAGE_BUCKETS))
+
+# 其他模块可在此注册额外的指标渲染函数, 每个函数返回若干行 exposition 文本
+collectors = []
+
+
+def observe_handler(service: str, func: str, kind: str, elapsed: float, error: bool = False):
+    key = (service, func, kind)
+    handler_calls[key] += 1
+    if error:
+        handler_errors[key] += 1
+    handler_latency[key].observe(elapsed)
+
+
+def observe_stage(stage: str, elapsed: float, hit: bool):
+    stage_runs[stage] += 1
+    if hit:
+        stage_hits[stage] += 1
+    stage_latency[stage].observe(elapsed)
+
+
+def _escape(v: str) -> str:
+    return v.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(**kw) -> str:
+    return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in kw.items()) + '}'
+
+
+def _render_histogram(lines: List[str], name: str, hist: Histogram, **labels):
+    for le, n in hist.cumulative():
+        lines.append(f'{name}_bucket{_labels(**labels, le=le)} {n}')
+    lines.append(f'{name}_sum{_labels(**labels)} {hist.sum}')
+    lines.append(f'{name}_count{_labels(**labels)} {hist.count}')
+
+
+def render() -> str:
+    lines = []
+    lines.append('# HELP hoshino_handler_calls_total Times a ServiceFunc was invoked.')
+    lines.append('# TYPE hoshino_handler_calls_total counter')
+    for (sv, func, kind), n in list(handler_calls.items()):
+        lines.append(f'hoshino_handler_calls_total{_labels(service=sv, func=func, kind=kind)} {n}')
+    lines.append('# HELP hoshino_handler_errors_total Times a ServiceFunc raised an exception.')
+    lines.append('# TYPE hoshino_handler_errors_total counter')
+    for (sv, func, kind), n in list(handler_errors.items()):
+        lines.append(f'hoshino_handler_errors_total{_labels(service=sv, func=func, kind=kind)} {n}')
+    lines.append('# HELP hoshino_handler_latency_seconds Time spent in a ServiceFunc.')
+    lines.append('# TYPE hoshino_handler_latency_seconds histogram')
+    for (sv, func, kind), hist in list(handler_latency.items()):
+        _render_histogram(lines, 'hoshino_handler_latency_seconds', hist, service=sv, func=func, kind=kind)
+    lines.append('# HELP hoshino_trigger_stage_runs_total Times a trigger stage was evaluated.')
+    lines.append('# TYPE hoshino_trigger_stage_runs_total counter')
+    for stage, n in list(stage_runs.items()):
+        lines.append(f'hoshino_trigger_stage_runs_total{_labels(stage=stage)} {n}')
+    lines.append('# HELP hoshino_trigger_stage_hits_total Times a trigger stage produced a candidate.')
+    lines.append('# TYPE hoshino_trigger_stage_hits_total counter')
+    for stage, n in list(stage_hits.items()):
+        lines.append(f'hoshino_trigger_stage_hits_total{_labels(stage=stage)} {n}')
+    lines.append('# HELP hoshino_trigger_stage_seconds Time spent matching in a trigger stage.')
+    lines.append('# TYPE hoshino_trigger_stage_seconds histogram')
+    for stage, hist in list(stage_latency.items()):
+        _render_histogram(lines, 'hoshino_trigger_stage_seconds', hist, stage=stage)
+    for collect in collectors:
+        lines.extend(collect())
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def mount(app, path='/metrics'):
+    """在 Quart app (即`bot.asgi`) 上挂载指标页面"""
+    async def metrics_endpoint():
+        return render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    app.add_url_rule(path, 'hoshino_metrics', metrics_endpoint, methods=['GET'])
@@ -1,6 +1,6 @@
 import re
 import hoshino
-from hoshino import sucmd, HoshinoBot
+from hoshino import grouplist, members, sucmd, HoshinoBot
 from hoshino.typing import CommandSession, CQHttpError, MessageSegment as ms
 
 @sucmd('billing')
@@ -17,9 +17,8 @@ async def billing(session: CommandSession):
     try:
         sid_group = {}
         for sid in hoshino.get_self_ids():
-            gs = await bot.get_group_list(self_id=sid)
-            sid_group[sid] = [g['group_id'] for g in gs]
-    except CQHttpError:
+            sid_group[sid] = await grouplist.cache.get(sid)
+    except CQHttpError as e:
         await session.finish(str(e))
 
     failed = []
@@ -52,10 +51,10 @@ async def billing(session: CommandSession):
 
 async def get_group_owner_id(bot: HoshinoBot, self_id, group_id) -> int:
     try:
-        members = await bot.get_group_member_list(self_id=self_id, group_id=group_id)
+        mlist = await members.cache.get_list(self_id, group_id)
     except CQHttpError:
         return 0
-    for m in members:
+    for m in mlist:
         if m.get('role') == 'owner':
             return m.get('user_id', 0)
     return 0
@@ -1,11 +1,12 @@
 import nonebot
 from nonebot import RequestSession, on_request
-from hoshino import util
+from hoshino import grouplist
 
 
 @on_request('group.invite')
 async def handle_group_invite(session: RequestSession):
     if session.ctx['user_id'] in nonebot.get_bot().config.SUPERUSERS:
         await session.approve()
+        grouplist.cache.add(session.ctx['self_id'], session.ctx['group_id'])
     else:
         await session.reject(reason='邀请入群请联系维护组')
@@ -1,4 +1,4 @@
-from hoshino import Service, priv
+from hoshino import Service, msgfields, priv
 from hoshino.typing import CQEvent
 
 sv = Service('_help_', manage_priv=priv.SUPERUSER, visible=False)
@@ -72,7 +72,7 @@ def gen_bundle_manual(bundle_name, service_list, gid):
 
 @sv.on_prefix('help', '帮助')
 async def send_help(bot, ev: CQEvent):
-    bundle_name = ev.message.extract_plain_text().strip()
+    bundle_name = msgfields.get(ev).plain_text
     bundles = Service.get_bundles()
     if not bundle_name:
         await bot.send(ev, TOP_MANUAL)
@@ -1,5 +1,5 @@
 from nonebot.argparse import ArgumentParser
-from hoshino import Service, sucmd
+from hoshino import Service, grouplist, sucmd
 from hoshino.typing import CommandSession
 
 
@@ -7,7 +7,7 @@ async def ls_group(session: CommandSession):
     bot = session.bot
     self_ids = bot._wsr_api_clients.keys()
     for sid in self_ids:
-        gl = await bot.get_group_list(self_id=sid)
+        gl = await grouplist.get_group_list(sid)
         msg = [ "{group_id} {group_name}".format_map(g) for g in gl ]
         msg = "\n".join(msg)
         msg = f"bot:{sid}\n| 群号 | 群名 | 共{len(gl)}个群\n" + msg
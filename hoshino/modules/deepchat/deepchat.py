@@ -1,26 +1,27 @@
 import random
+
 import hoshino
-from hoshino import Service, aiorequests, priv
+from hoshino import Service, aiorequests, msgfields, priv
+from hoshino.executor import BEST_EFFORT
 from hoshino.util import DailyNumberLimiter
 from hoshino.typing import CQEvent
 
-sv = Service('deepchat', manage_priv=priv.SUPERUSER, enable_on_default=False, visible=False)
+sv = Service('deepchat', manage_priv=priv.SUPERUSER, enable_on_default=False, visible=False, priority=BEST_EFFORT)
 lmt = DailyNumberLimiter(10)
 
 @sv.on_message('group')
 async def deepchat(bot, ev: CQEvent):
+    # 回复后的若干条消息内不再回复; 冷却需逐条计数, 因此不用 probability 等前置过滤
     gid = ev.group_id
-
     if not lmt.check(gid):
         lmt.reset(gid)
     if lmt.get_num(gid):
         lmt.increase(gid)
         return
-
-    msg = ev['message'].extract_plain_text()
-    if not msg or random.random() > 0.060:
+    if random.random() >= 0.060:
         return
-    if not lmt.check(ev.group_id):
+    msg = msgfields.get(ev).plain_text
+    if not msg:
         return
     payload = {
         "msg": msg,
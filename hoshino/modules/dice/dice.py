@@ -1,7 +1,7 @@
 import re
 import random
 
-from hoshino import Service
+from hoshino import Service, msgfields
 from hoshino.typing import CQEvent
 from hoshino.util import filt_message
 
@@ -51,6 +51,6 @@ async def dice(bot, ev):
 
 @sv.on_prefix('.qj')
 async def kc_marriage(bot, ev: CQEvent):
-    wife = filt_message(ev.message.extract_plain_text().strip())
+    wife = filt_message(msgfields.get(ev).plain_text)
     tip = f'与{wife}的ケッコンカッコカリ结果是：' if wife else '的ケッコンカッコカリ结果是：'
     await do_dice(bot, ev, 1, 3, 6, 1, 0, tip)
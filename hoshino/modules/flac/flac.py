@@ -1,5 +1,5 @@
 """无损音乐搜索 数据来自acgjc.com"""
-from hoshino import Service, priv, logger, aiorequests
+from hoshino import Service, priv, logger, aiorequests, msgfields
 from hoshino.typing import CQEvent
 from urllib.parse import quote
 
@@ -7,7 +7,7 @@ sv = Service('flac', help_='[搜无损] +关键词搜索')
 
 @sv.on_prefix('搜无损')
 async def search_flac(bot, ev: CQEvent):
-    keyword = ev.message.extract_plain_text()
+    keyword = msgfields.get(ev).plain_text
     resp = await aiorequests.get('http://mtage.top:8099/acg-music/search', params={'title-keyword': keyword}, timeout=1)
     res = await resp.json()
     if res['success'] is False:
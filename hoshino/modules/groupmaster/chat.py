@@ -3,6 +3,7 @@ import random
 from nonebot import on_command
 
 from hoshino import R, Service, priv, util
+from hoshino.executor import BEST_EFFORT
 
 
 # basic function for debug, not included in Service('chat')
@@ -11,7 +12,7 @@ async def say_hello(session):
     await session.send('はい！私はいつも貴方の側にいますよ！')
 
 
-sv = Service('chat', visible=False)
+sv = Service('chat', visible=False, priority=BEST_EFFORT)
 
 @sv.on_fullmatch('沙雕机器人')
 async def say_sorry(bot, ev):
@@ -1,6 +1,6 @@
 
 import hoshino
-from hoshino import Service, util
+from hoshino import Service, members, util
 from hoshino.typing import NoticeSession, CQHttpError
 
 sv1 = Service('group-leave-notice', help_='退群通知')
@@ -11,9 +11,11 @@ async def leave_notice(session: NoticeSession):
     name = ev.user_id
     if ev.user_id == ev.self_id:
         return
+    info = members.cache.peek(ev.self_id, ev.group_id, ev.user_id)    # 退群前缓存过的群名片
     try:
-        info = await session.bot.get_stranger_info(self_id=ev.self_id, user_id=ev.user_id)
-        name = info['nickname'] or name
+        if info is None:
+            info = await session.bot.get_stranger_info(self_id=ev.self_id, user_id=ev.user_id)
+        name = info.get('card') or info['nickname'] or name
         name = util.filt_message(name)
     except CQHttpError as e:
         sv1.logger.exception(e)
@@ -2,9 +2,10 @@ import random
 
 import hoshino
 from hoshino import Service, util
+from hoshino.executor import BEST_EFFORT
 from hoshino.typing import CQEvent, CQHttpError, Message
 
-sv = Service('random-repeater', help_='随机复读机')
+sv = Service('random-repeater', help_='随机复读机', priority=BEST_EFFORT)
 
 PROB_A = 1.4
 group_stat = {}     # group_id: (last_msg, is_repeated, p)
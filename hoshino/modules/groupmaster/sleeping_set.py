@@ -4,7 +4,7 @@ import random
 
 
 
-from hoshino import Service, priv, util
+from hoshino import Service, msgfields, priv, util
 from hoshino.typing import CQEvent
 
 sv = Service('sleeping-set', help_='''
@@ -19,7 +19,8 @@ async def sleep_8h(bot, ev):
 
 @sv.on_rex(r'(来|來)(.*(份|个)(.*)(睡|茶)(.*))套餐')
 async def sleep(bot, ev: CQEvent):
-    base = 0 if '午' in ev.plain_text else 5*60*60
-    length = len(ev.plain_text)
+    text = msgfields.get(ev).plain_text
+    base = 0 if '午' in text else 5*60*60
+    length = len(text)
     sleep_time = base + round(math.sqrt(length) * 60 * 30 + 60 * random.randint(-15, 15))
     await util.silence(ev, sleep_time, skip_su=False)
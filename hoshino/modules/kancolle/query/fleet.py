@@ -2,7 +2,7 @@ import os
 import re
 import random
 
-from hoshino import util, R
+from hoshino import util, R, msgfields
 
 from . import sv
 
@@ -47,7 +47,7 @@ async def random_equip(bot, ev):
 
 @sv.on_prefix('*')
 async def kc_query(bot, ev):
-    key = ev.message.extract_plain_text()
+    key = msgfields.get(ev).plain_text
     if key in DB:
         sv.logger.info(DB[key])
         await bot.send(ev, DB[key], at_sender=True)
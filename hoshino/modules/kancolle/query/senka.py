@@ -4,7 +4,7 @@ from io import BytesIO
 
 from PIL import Image
 
-from hoshino import R, aiorequests
+from hoshino import R, aiorequests, msgfields
 from hoshino.typing import CQEvent
 
 from . import sv
@@ -46,7 +46,7 @@ syntax_rex = re.compile(r'^\d{6}$')
 
 @sv.on_prefix('人事表')
 async def rank_result(bot, ev: CQEvent):
-    m = syntax_rex.match(ev.message.extract_plain_text().strip())
+    m = syntax_rex.match(msgfields.get(ev).plain_text)
     if not m:
         await bot.finish(ev, "用法：人事表yymmss\n例：查询21年06月吴镇\n> 人事表210602\n※服务器编号见https://senka.su/")
     rankid = m.group()
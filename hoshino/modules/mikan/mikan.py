@@ -1,8 +1,6 @@
 import random
 from datetime import datetime
 
-from lxml import etree
-
 import hoshino
 from hoshino import Service, aiorequests
 
@@ -19,6 +17,7 @@ class Mikan:
 
     @staticmethod
     async def get_rss():
+        from lxml import etree  # 首次拉取时才加载
         res = []
         try:
             resp = await aiorequests.get('https://mikanani.me/RSS/MyBangumi', params={'token': Mikan.get_token()}, timeout=10)
@@ -3,30 +3,22 @@
 
 from nonebot import on_command
 
-from hoshino import R, Service, util
+from hoshino import R, Service, msgfields, util
+from hoshino.executor import CRITICAL
 from hoshino.typing import *
 
 from .argparse import ArgParser
 from .exception import *
 
-sv = Service('clanbattle', help_='Hoshino开源版 命令以感叹号开头 发送【!帮助】查看说明', bundle='pcr会战')
+sv = Service('clanbattle', help_='Hoshino开源版 命令以感叹号开头 发送【!帮助】查看说明', bundle='pcr会战', priority=CRITICAL)
 SORRY = 'ごめんなさい！嘤嘤嘤(〒︿〒)'
 
 _registry:Dict[str, Tuple[Callable, ArgParser]] = {}
 
-@sv.on_message('group')
+@sv.on_message('group', startswith=('!', '！'))
 async def _clanbattle_bus(bot, ctx):
-    # check prefix
-    start = ''
-    for m in ctx['message']:
-        if m.type == 'text':
-            start = m.data.get('text', '').lstrip()
-            break
-    if not start or start[0] not in '!！':
-        return
-
     # find cmd
-    plain_text = ctx['message'].extract_plain_text()
+    plain_text = msgfields.get(ctx).plain_text
     if len(plain_text) <= 1:
         return
     cmd, *args = plain_text[1:].split()
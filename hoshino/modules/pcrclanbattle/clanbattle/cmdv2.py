@@ -10,10 +10,9 @@ PCR会战管理命令 v2
 """
 
 import os
-import asyncio
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import List
-from matplotlib import pyplot as plt
 try:
     import ujson as json
 except:
@@ -23,7 +22,7 @@ from aiocqhttp.exceptions import ActionFailed
 from nonebot import NoneBot
 from nonebot import MessageSegment as ms
 from nonebot.typing import Context_T
-from hoshino import util, priv
+from hoshino import members, util, priv
 
 from . import sv, cb_cmd
 from .argparse import ArgParser, ArgHolder, ParseResult
@@ -31,8 +30,16 @@ from .argparse.argtype import *
 from .battlemaster import BattleMaster
 from .exception import *
 
-plt.style.use('seaborn-pastel')
-plt.rcParams['font.family'] = ['DejaVuSans', 'Microsoft YaHei', 'SimSun', ]
+@lru_cache(maxsize=None)
+def _pyplot():
+    # matplotlib 导入较慢, 首次作图时才加载
+    from matplotlib import pyplot as plt
+    try:
+        plt.style.use('seaborn-pastel')
+    except OSError:     # matplotlib >= 3.6 更名
+        plt.style.use('seaborn-v0_8-pastel')
+    plt.rcParams['font.family'] = ['DejaVuSans', 'Microsoft YaHei', 'SimSun', ]
+    return plt
 
 USAGE_ADD_CLAN = '!建会 N公会名 S服务器代号'
 USAGE_ADD_MEMBER = '!入会 昵称 (@qq)'
@@ -100,11 +107,11 @@ async def add_member(bot:NoneBot, ctx:Context_T, args:ParseResult):
     if uid != ctx['user_id']:
         _check_admin(ctx, '才能添加其他人')
         try:    # 尝试获取群员信息，用以检查该成员是否在群中
-            await bot.get_group_member_info(self_id=ctx['self_id'], group_id=bm.group, user_id=uid)
+            await members.cache.get(ctx['self_id'], bm.group, uid)
         except:
             raise NotFoundError(f'Error: 无法获取群员信息，请检查{uid}是否属于本群')
     if not name:
-        m = await bot.get_group_member_info(self_id=ctx['self_id'], group_id=bm.group, user_id=uid)
+        m = await members.cache.get(ctx['self_id'], bm.group, uid)
         name = util.filt_message(m['card']) or util.filt_message(m['nickname']) or str(m['user_id'])
 
     mem = bm.get_member(uid, bm.group) or bm.get_member(uid, 0)     # 兼容cmdv1
@@ -157,7 +164,7 @@ async def batch_add_member(bot:NoneBot, ctx:Context_T, args:ParseResult):
     clan = _check_clan(bm)
     _check_admin(ctx)
     try:
-        mlist = await bot.get_group_member_list(self_id=ctx['self_id'], group_id=bm.group)
+        mlist = await members.cache.get_list(ctx['self_id'], bm.group)
     except ActionFailed:
         raise ClanBattleError('Bot缓存未更新，暂时无法使用一键入会。请尝试【!入会】命令逐个添加')
     if len(mlist) > 50:
@@ -702,6 +709,7 @@ async def stat_damage(bot:NoneBot, ctx:Context_T, args:ParseResult):
     ]
 
     # generate statistic figure
+    plt = _pyplot()
     fig, ax = plt.subplots()
     fig.set_size_inches(10, y_size)
     ax.set_title(f"{clan['name']}{yyyy}年{mm}月会战伤害统计")
@@ -749,6 +757,7 @@ async def stat_score(bot:NoneBot, ctx:Context_T, args:ParseResult):
     #     msg.append(f"{blank}{score}分 | {name}")
 
     # generate statistic figure
+    plt = _pyplot()
     fig, ax = plt.subplots()
     score = list(map(lambda i: i[3], stat))
     yn = len(stat)
@@ -846,4 +855,3 @@ async def list_challenge(bot:NoneBot, ctx:Context_T, args:ParseResult):
             msg.append(challenstr.format_map(c))
         await bot.send(ctx, '\n'.join(msg))
         msg.clear()
-        await asyncio.sleep(0.5)
@@ -1,4 +1,4 @@
-from hoshino import Service, priv
+from hoshino import Service, msgfields, priv
 from hoshino.typing import CQEvent
 
 sv = Service('clanbattle-version-selector', manage_priv=priv.SUPERUSER, visible=False)
@@ -21,7 +21,7 @@ web绝赞开发中
 @sv.on_prefix('会战启用', '启用会战')
 async def version_select(bot, ev: CQEvent):
     gid = ev.group_id
-    arg = ev.message.extract_plain_text()
+    arg = msgfields.get(ev).plain_text
     svs = Service.get_loaded_services()
     cbsvs = {
         'v2': svs.get('clanbattle'),
@@ -1,11 +1,11 @@
 import re
 import time
-import asyncio
 from collections import defaultdict
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 
 import hoshino
-from hoshino import Service, R
+from hoshino import Service, R, msgfields
 from hoshino.typing import *
 from hoshino.util import FreqLimiter, concat_pic, pic2b64, silence, filt_message
 
@@ -27,13 +27,15 @@ aliases_b = tuple('b' + a for a in aliases) + tuple('B' + a for a in aliases)
 aliases_tw = tuple('台' + a for a in aliases)
 aliases_jp = tuple('日' + a for a in aliases)
 
-try:
-    thumb_up_i = R.img('priconne/gadget/thumb-up-i.png').open().resize((16, 16), Image.LANCZOS)
-    thumb_up_a = R.img('priconne/gadget/thumb-up-a.png').open().resize((16, 16), Image.LANCZOS)
-    thumb_down_i = R.img('priconne/gadget/thumb-down-i.png').open().resize((16, 16), Image.LANCZOS)
-    thumb_down_a = R.img('priconne/gadget/thumb-down-a.png').open().resize((16, 16), Image.LANCZOS)
-except Exception as e:
-    sv.logger.exception(e)
+@lru_cache(maxsize=None)
+def _thumb(name):
+    # 首次出图时才读取, 不拖慢启动
+    return R.img(f'priconne/gadget/{name}.png').open().resize((16, 16), Image.LANCZOS)
+
+
+@lru_cache(maxsize=None)
+def _font():
+    return ImageFont.truetype('msyh.ttc', 16)
 
 @sv.on_prefix(aliases)
 async def arena_query(bot, ev):
@@ -56,7 +58,7 @@ def render_atk_def_teams(entries, border_pix=5):
     n = len(entries)
     icon_size = 64
     im = Image.new('RGBA', (5 * icon_size + 100, n * (icon_size + border_pix) - border_pix), (255, 255, 255, 255))
-    font = ImageFont.truetype('msyh.ttc', 16)
+    font = _font()
     draw = ImageDraw.Draw(im)
     for i, e in enumerate(entries):
         y1 = i * (icon_size + border_pix)
@@ -66,8 +68,8 @@ def render_atk_def_teams(entries, border_pix=5):
             x1 = j * icon_size
             x2 = x1 + icon_size
             im.paste(icon, (x1, y1, x2, y2), icon)
-        thumb_up = thumb_up_a if e['user_like'] > 0 else thumb_up_i
-        thumb_down = thumb_down_a if e['user_like'] < 0 else thumb_down_i
+        thumb_up = _thumb('thumb-up-a' if e['user_like'] > 0 else 'thumb-up-i')
+        thumb_down = _thumb('thumb-down-a' if e['user_like'] < 0 else 'thumb-down-i')
         x1 = 5 * icon_size + 5
         x2 = x1 + 16
         im.paste(thumb_up, (x1, y1+22, x2, y1+38), thumb_up)
@@ -88,7 +90,7 @@ async def _arena_query(bot, ev: CQEvent, region: int):
     lmt.start_cd(uid)
 
     # 处理输入数据
-    defen = ev.message.extract_plain_text()
+    defen = msgfields.get(ev).plain_text
     defen = re.sub(r'[?？，,_]', '', defen)
     defen, unknown = chara.roster.parse_team(defen)
 
@@ -186,7 +188,7 @@ async def arena_dislike(bot, ev):
 rex_qkey = re.compile(r'^[0-9a-zA-Z]{5}$')
 async def _arena_feedback(bot, ev: CQEvent, action: int):
     action_tip = '赞' if action > 0 else '踩'
-    qkey = ev.message.extract_plain_text().strip()
+    qkey = msgfields.get(ev).plain_text
     if not qkey:
         await bot.finish(ev, f'请发送"点{action_tip}+作业id"，如"点{action_tip}ABCDE"，不分大小写', at_sender=True)
     if not rex_qkey.match(qkey):
@@ -216,7 +218,6 @@ async def upload(ss: CommandSession):
 async def _(ss: CommandSession):
     if ss.is_first_run:
         await ss.send('我将帮您上传作业至pcrdfans，作业将注明您的昵称及qq。您可以随时发送"算了"或"取消"终止上传。')
-        await asyncio.sleep(0.5)
         return
     arg = ss.current_arg_text.strip()
     if arg == '算了' or arg == '取消':
@@ -1,13 +1,13 @@
 import importlib
 from io import BytesIO
 
-import pygtrie
 import requests
 from fuzzywuzzy import fuzz, process
 from PIL import Image
 
 import hoshino
 from hoshino import R, log, sucmd, util
+from hoshino.util.trie import FrozenTrie
 from hoshino.typing import CommandSession
 
 from . import _pcr_data
@@ -37,20 +37,20 @@ except Exception as e:
 class Roster:
 
     def __init__(self):
-        self._roster = pygtrie.CharTrie()
         self.update()
     
     def update(self):
         importlib.reload(_pcr_data)
-        self._roster.clear()
+        roster = {}
         for idx, names in _pcr_data.CHARA_NAME.items():
             for n in names:
                 n = util.normalize_str(n)
-                if n not in self._roster:
-                    self._roster[n] = idx
+                if n not in roster:
+                    roster[n] = idx
                 else:
-                    logger.warning(f'priconne.chara.Roster: 出现重名{n}于id{idx}与id{self._roster[n]}')
-        self._all_name_list = self._roster.keys()
+                    logger.warning(f'priconne.chara.Roster: 出现重名{n}于id{idx}与id{roster[n]}')
+        self._roster = FrozenTrie(roster)
+        self._all_name_list = self._roster.keys()   # 已规范化, 模糊匹配时无需再处理
 
 
     def get_id(self, name):
@@ -60,7 +60,7 @@ class Roster:
 
     def guess_id(self, name):
         """@return: id, name, score"""
-        name, score = process.extractOne(name, self._all_name_list, processor=util.normalize_str)
+        name, score = process.extractOne(util.normalize_str(name), self._all_name_list, processor=None)
         return self._roster[name], name, score
 
 
@@ -11,7 +11,7 @@
 import re
 from itertools import zip_longest
 
-from hoshino import Service, util
+from hoshino import Service, msgfields, util
 from hoshino.typing import CQEvent
 
 sv = Service('pcr-cherugo', bundle='pcr娱乐', help_='''
@@ -66,7 +66,7 @@ def cheru2str(c: str) -> str:
 
 @sv.on_prefix('切噜一下')
 async def cherulize(bot, ev: CQEvent):
-    s = ev.message.extract_plain_text()
+    s = msgfields.get(ev).plain_text
     if len(s) > 500:
         await bot.send(ev, '切、切噜太长切不动勒切噜噜...', at_sender=True)
         return
@@ -75,7 +75,7 @@ async def cherulize(bot, ev: CQEvent):
 
 @sv.on_prefix('切噜～♪')
 async def decherulize(bot, ev: CQEvent):
-    s = ev.message.extract_plain_text()
+    s = msgfields.get(ev).plain_text
     if len(s) > 1501:
         await bot.send(ev, '切、切噜太长切不动勒切噜噜...', at_sender=True)
         return
@@ -8,7 +8,7 @@ try:
 except:
     import json
 
-from hoshino import aiorequests, R, Service
+from hoshino import aiorequests, msgfields, R, Service
 from hoshino.typing import *
 
 sv_help = '''
@@ -29,7 +29,7 @@ def get_pic_name(id_):
 
 @sv.on_prefix('官漫')
 async def comic(bot, ev: CQEvent):
-    episode = ev.message.extract_plain_text()
+    episode = msgfields.get(ev).plain_text
     if not re.fullmatch(r'\d{0,3}', episode):
         return
     episode = episode.lstrip('0')
@@ -2,7 +2,7 @@ import os
 import random
 from collections import defaultdict
 
-from hoshino import Service, priv, util
+from hoshino import Service, msgfields, priv, util
 from hoshino.typing import *
 from hoshino.util import DailyNumberLimiter, concat_pic, pic2b64, silence
 
@@ -65,7 +65,7 @@ POOL_NAME_TIP = '请选择以下卡池\n> 切换卡池jp\n> 切换卡池tw\n> 
 async def set_pool(bot, ev: CQEvent):
     if not priv.check_priv(ev, priv.ADMIN):
         await bot.finish(ev, '只有群管理才能切换卡池', at_sender=True)
-    name = util.normalize_str(ev.message.extract_plain_text())
+    name = msgfields.get(ev).norm_text
     if not name:
         await bot.finish(ev, POOL_NAME_TIP, at_sender=True)
     elif name in ('国', '国服', 'cn'):
@@ -216,11 +216,9 @@ async def kakin(bot, ev: CQEvent):
     if ev.user_id not in bot.config.SUPERUSERS:
         return
     count = 0
-    for m in ev.message:
-        if m.type == 'at' and m.data['qq'] != 'all':
-            uid = int(m.data['qq'])
-            jewel_limit.reset(uid)
-            tenjo_limit.reset(uid)
-            count += 1
+    for uid in msgfields.get(ev).at_ids:
+        jewel_limit.reset(uid)
+        tenjo_limit.reset(uid)
+        count += 1
     if count:
         await bot.send(ev, f"已为{count}位用户充值完毕！谢谢惠顾～")
@@ -8,7 +8,7 @@ import asyncio
 import os
 import random
 
-from hoshino import Service, util
+from hoshino import Service, members, msgfields, util
 from hoshino.modules.priconne import _pcr_data, chara
 from hoshino.typing import CQEvent
 from hoshino.typing import MessageSegment as Seg
@@ -34,13 +34,11 @@ sv = Service(
 @sv.on_fullmatch("猜头像排行", "猜头像排名", "猜头像排行榜", "猜头像群排行")
 async def description_guess_group_ranking(bot, ev: CQEvent):
     ranking = gm.db.get_ranking(ev.group_id)
+    infos = await members.cache.get_many(ev.self_id, ev.group_id, (uid for uid, _ in ranking))
     msg = ["【猜头像小游戏排行榜】"]
-    for i, item in enumerate(ranking):
-        uid, count = item
-        m = await bot.get_group_member_info(
-            self_id=ev.self_id, group_id=ev.group_id, user_id=uid
-        )
-        name = util.filt_message(m["card"]) or util.filt_message(m["nickname"]) or str(uid)
+    for i, (uid, count) in enumerate(ranking):
+        m = infos[uid] or {}
+        name = util.filt_message(m.get("card", "")) or util.filt_message(m.get("nickname", "")) or str(uid)
         msg.append(f"第{i + 1}名：{name} 猜对{count}次")
     await bot.send(ev, "\n".join(msg))
 
@@ -68,12 +66,12 @@ async def avatar_guess(bot, ev: CQEvent):
     await bot.send(ev, f"正确答案是：{c.name} {c.icon.cqcode}\n很遗憾，没有人答对~")
 
 
-@sv.on_message()
+@sv.on_message(when=lambda ev: gm.is_playing(ev.group_id))
 async def on_input_chara_name(bot, ev: CQEvent):
     game = gm.get_game(ev.group_id)
     if not game or game.winner:
         return
-    c = chara.fromname(ev.message.extract_plain_text())
+    c = chara.fromname(msgfields.get(ev).plain_text)
     if c.id != chara.UNKNOWN and c.id == game.answer:
         game.winner = ev.user_id
         n = game.record()
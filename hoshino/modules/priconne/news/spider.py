@@ -6,7 +6,6 @@ import abc
 from dataclasses import dataclass
 from typing import List, Union
 
-from bs4 import BeautifulSoup
 from hoshino import aiorequests
 
 
@@ -58,6 +57,7 @@ class SonetSpider(BaseSpider):
 
     @staticmethod
     async def get_items(resp:aiorequests.AsyncResponse):
+        from bs4 import BeautifulSoup   # bs4/lxml 导入较慢, 首次抓取时才加载
         soup = BeautifulSoup(await resp.text, 'lxml')
         return [
             Item(idx=dd.a["href"],
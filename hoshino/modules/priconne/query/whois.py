@@ -1,3 +1,4 @@
+from hoshino import msgfields
 from hoshino.typing import CQEvent
 from hoshino.util import FreqLimiter, filt_message
 
@@ -9,7 +10,7 @@ lmt = FreqLimiter(5)
 @sv.on_suffix('是谁')
 @sv.on_prefix('谁是')
 async def whois(bot, ev: CQEvent):
-    name = ev.message.extract_plain_text().strip()
+    name = msgfields.get(ev).plain_text
     if not name:
         return
     id_ = chara.name2id(name)
@@ -8,9 +8,6 @@ from collections import defaultdict
 from dataclasses import dataclass, field
 from typing import Dict, Iterable, Set
 
-import peony
-from peony import PeonyClient
-
 from hoshino import Service, priv
 from hoshino.config import twitter as cfg
 from hoshino.typing import MessageSegment as ms
@@ -70,7 +67,7 @@ class UserIdCache:
                 sv.logger.exception(e)
                 sv.logger.error(f"{type(e)} occured when loading `~/.hoshino/twitter_uid_cache.json`, using empty cache.")
 
-    async def convert(self, client: PeonyClient, screen_names: Iterable[str], cached=True):
+    async def convert(self, client: "peony.PeonyClient", screen_names: Iterable[str], cached=True):
         if not cached:
             self.cache = {}
         for i in screen_names:
@@ -84,6 +81,8 @@ class UserIdCache:
 
 
 async def follow_stream():
+    import peony    # peony 导入较慢, 推流启动时才加载
+    from peony import PeonyClient
     client = PeonyClient(
         consumer_key=cfg.consumer_key,
         consumer_secret=cfg.consumer_secret,
@@ -2,9 +2,6 @@
 
 import re
 
-import peony
-from peony import PeonyClient
-
 from hoshino import Service
 from hoshino.config import twitter as cfg
 
@@ -13,6 +10,8 @@ from .util import format_tweet
 sv = Service('uma-ura9-sniffer', enable_on_default=False, help_='嗅探新鲜出炉的9URA种马', bundle='umamusume')
 
 async def track_stream():
+    import peony    # peony 导入较慢, 推流启动时才加载
+    from peony import PeonyClient
     client = PeonyClient(
         consumer_key=cfg.consumer_key,
         consumer_secret=cfg.consumer_secret,
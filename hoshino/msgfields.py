@@ -0,0 +1,81 @@
+"""消息的派生字段
+
+`get(ev)`返回事件上缓存的`MessageFields`, 各字段在首次访问时计算, 之后直接复用,
+处理函数不必再对同一条消息反复`extract_plain_text()`.
+
+前缀/后缀/完全匹配触发器会改写`ev.message`, 改写后须调用`invalidate(ev)`;
+整体替换`ev.message`时缓存也会自动失效.
+"""
+
+from hoshino import util
+from hoshino.typing import CQEvent, Message, Tuple
+
+_KEY = 'fields'
+
+
+class MessageFields:
+    __slots__ = ('message', '_plain_text', '_norm_text', '_first_text', '_last_text', '_at_ids', '_image_count')
+
+    def __init__(self, message: Message):
+        self.message = message
+        self._plain_text = None
+        self._norm_text = None
+        self._first_text = None
+        self._last_text = None
+        self._at_ids = None
+        self._image_count = None
+
+    @property
+    def plain_text(self) -> str:
+        """全部文本段, 去除首尾空白"""
+        if self._plain_text is None:
+            self._plain_text = self.message.extract_plain_text().strip()
+        return self._plain_text
+
+    @property
+    def norm_text(self) -> str:
+        """`plain_text`经`util.normalize_str`规范化"""
+        if self._norm_text is None:
+            self._norm_text = util.normalize_str(self.plain_text)
+        return self._norm_text
+
+    @property
+    def first_text(self) -> str:
+        """第一个文本段, 去除开头空白; 没有文本段时为空串"""
+        if self._first_text is None:
+            self._first_text = next((seg.data.get('text', '') for seg in self.message if seg.type == 'text'), '').lstrip()
+        return self._first_text
+
+    @property
+    def last_text(self) -> str:
+        """最后一个文本段, 去除结尾空白; 没有文本段时为空串"""
+        if self._last_text is None:
+            self._last_text = next((seg.data.get('text', '') for seg in reversed(self.message) if seg.type == 'text'), '').rstrip()
+        return self._last_text
+
+    @property
+    def at_ids(self) -> Tuple[int, ...]:
+        """按出现顺序被@的QQ号, 不含@全体成员"""
+        if self._at_ids is None:
+            self._at_ids = tuple(
+                int(seg.data['qq']) for seg in self.message
+                if seg.type == 'at' and seg.data.get('qq') != 'all'
+            )
+        return self._at_ids
+
+    @property
+    def image_count(self) -> int:
+        if self._image_count is None:
+            self._image_count = sum(seg.type == 'image' for seg in self.message)
+        return self._image_count
+
+
+def get(ev: CQEvent) -> MessageFields:
+    fields = ev.get(_KEY)
+    if fields is None or fields.message is not ev.message:
+        fields = ev[_KEY] = MessageFields(ev.message)
+    return fields
+
+
+def invalidate(ev: CQEvent):
+    ev.pop(_KEY, None)
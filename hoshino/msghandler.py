@@ -1,21 +1,35 @@
-from hoshino import CanceledException, message_preprocessor, trigger
+from time import perf_counter
+
+from hoshino import CanceledException, message_preprocessor, metrics, msgfields, priv, trigger
+from hoshino.executor import executor
 from hoshino.typing import CQEvent
 
 
+async def _run(service_func, bot, event: CQEvent):
+    error = False
+    start = perf_counter()
+    try:
+        await service_func.func(bot, event)
+    except CanceledException:
+        pass    # finish() 等主动结束
+    except Exception as e:
+        error = True
+        service_func.sv.logger.error(f'{type(e)} occured when {service_func.__name__} handling message {event.message_id}.')
+        service_func.sv.logger.exception(e)
+    finally:
+        metrics.observe_handler(service_func.sv.name, service_func.__name__, 'message', perf_counter() - start, error)
+
+
 @message_preprocessor
 async def handle_message(bot, event: CQEvent, _):
 
     if event.detail_type != 'group':
         return
 
-    service_funcs = []
-    for t in trigger.chain:
-        service_funcs.extend(t.find_handler(event))
-
-    if not service_funcs:
-        return  # triggered nothing.
+    if priv.check_block_group(event.group_id):
+        return  # 群被拉黑时所有服务均不响应, 无需匹配
 
-    for service_func in service_funcs:
+    for service_func in trigger.iter_handlers(event, services=trigger.enabled_services(event.group_id)):
 
         if service_func.only_to_me and not event['to_me']:
             continue  # not to me, ignore.
@@ -24,12 +38,18 @@ async def handle_message(bot, event: CQEvent, _):
             continue  # permission denied.
 
         service_func.sv.logger.info(f'Message {event.message_id} triggered {service_func.__name__}.')
-        try:
-            await service_func.func(bot, event)
-        except CanceledException:
-            raise
-        except Exception as e:
-            service_func.sv.logger.error(f'{type(e)} occured when {service_func.__name__} handling message {event.message_id}.')
-            service_func.sv.logger.exception(e)
+        # 兼容旧接口: 处理函数仍可读取 ev.plain_text / ev.norm_text, 新代码请使用 msgfields.get(ev)
+        fields = msgfields.get(event)
+        event.plain_text = fields.plain_text
+        event.norm_text = fields.norm_text
+        # 匹配与权限检查在此同步完成, 函数体交给执行器: 同群按序, 跨群并发
+        sv = service_func.sv
+        await executor.submit(
+            event.group_id,
+            lambda: _run(service_func, bot, event),
+            lambda reason: sv.logger.warning(f'Message {event.message_id} dropped ({reason}) before {service_func.__name__} ran.'),
+            priority=sv.priority,
+            tag=sv.name,
+        )
         raise CanceledException('Handled by Hoshino')
         # exception raised, no need for break
@@ -0,0 +1,109 @@
+"""`Service.on_message`的多路复用
+
+每种消息事件只向 nonebot 注册一个处理函数, 由它分发给全部`on_message`:
+
+- 群内启用的处理函数按群缓存, 服务开关时失效, 不必对每条消息逐个检查服务是否启用
+- 每条消息依次经过权限检查、执行器的负载准入(见`executor.admit`)与处理函数声明的前置过滤:
+  `startswith`(首个文本段的开头), `when(ev)`, `probability`(采样概率); 未通过的消息不会为其创建协程
+- 前置过滤只在前面的检查都通过时才执行, 也可能被跳过, `when`须为无副作用的纯判断
+"""
+
+import asyncio
+import random
+from time import perf_counter
+
+import hoshino
+from hoshino import executor, metrics, msgfields, priv
+from hoshino.typing import Callable, CQEvent, Dict, List, Tuple, Union
+
+
+class OnMessageFunc:
+    __slots__ = ('sv', 'func', 'startswith', 'when', 'probability', '__name__')
+
+    def __init__(self, sv, func: Callable, startswith: Union[str, Tuple[str, ...]] = None,
+                 when: Callable[[CQEvent], bool] = None, probability: float = 1.0):
+        self.sv = sv
+        self.func = func
+        self.startswith = (startswith, ) if isinstance(startswith, str) else startswith
+        self.when = when
+        self.probability = probability
+        self.__name__ = func.__name__
+
+    def accept(self, ev: CQEvent) -> bool:
+        if not priv.check_priv(ev, self.sv.use_priv):
+            return False
+        if not executor.executor.admit(self.sv.priority, self.sv.name):
+            return False
+        if self.startswith and not msgfields.get(ev).first_text.startswith(self.startswith):
+            return False
+        if self.when and not self.when(ev):
+            return False
+        return self.probability >= 1 or random.random() < self.probability
+
+    async def run(self, bot, ev: CQEvent):
+        sv = self.sv
+        error = False
+        start = perf_counter()
+        try:
+            await self.func(bot, ev)
+        except Exception as e:
+            error = True
+            sv.logger.error(f'{type(e)} occured when {self.__name__} handling message {ev["message_id"]}.')
+            sv.logger.exception(e)
+        finally:
+            metrics.observe_handler(sv.name, self.__name__, 'on_message', perf_counter() - start, error)
+
+
+class Multiplexer:
+
+    def __init__(self, event: str):
+        self.event = event
+        self.funcs: List[OnMessageFunc] = []
+        self._group_funcs: Dict[int, Tuple[OnMessageFunc, ...]] = {}
+
+    def add(self, func: OnMessageFunc):
+        if not self.funcs:
+            hoshino.get_bot().on_message(self.event)(self.dispatch)
+        self.funcs.append(func)
+        self._group_funcs.clear()
+
+    def invalidate(self, group_id=None):
+        if group_id is None:
+            self._group_funcs.clear()
+        else:
+            self._group_funcs.pop(group_id, None)
+
+    def enabled_funcs(self, group_id) -> Tuple[OnMessageFunc, ...]:
+        funcs = self._group_funcs.get(group_id)
+        if funcs is None:
+            funcs = self._group_funcs[group_id] = tuple(f for f in self.funcs if f.sv.check_enabled(group_id))
+        return funcs
+
+    async def dispatch(self, ev: CQEvent):
+        gid = ev.group_id
+        if priv.check_block_group(gid):
+            return
+        funcs = self.enabled_funcs(gid)
+        if not funcs:
+            return
+        bot = hoshino.get_bot()
+        coros = [f.run(bot, ev) for f in funcs if f.accept(ev)]
+        if len(coros) == 1:
+            await coros[0]
+        elif coros:
+            await asyncio.gather(*coros)
+
+
+_muxes: Dict[str, Multiplexer] = {}
+
+
+def get(event: str) -> Multiplexer:
+    if event not in _muxes:
+        _muxes[event] = Multiplexer(event)
+    return _muxes[event]
+
+
+def invalidate(group_id=None):
+    """服务在群内开关后调用, 清除启用函数的缓存; `group_id`为 None 时清除全部"""
+    for mux in _muxes.values():
+        mux.invalidate(group_id)
@@ -0,0 +1,210 @@
+"""出站消息管道
+
+`install(bot)`接管`bot.send_msg`与`bot.send_group_msg`, 所有群消息(包括`bot.send`的群内回复)都经由这里发出:
+
+- 每个群一个队列, 按提交顺序发送; 每个群与每个账号各有一个令牌桶,
+  同一群的连续回复会被自动放缓, 模块不必再自行`asyncio.sleep`
+- 队列中同一账号相邻的短纯文本消息合并为一条, 以换行分隔; 含图片、at 等非文本段的消息不参与合并.
+  经`send_group_msg`发出的短文本出队时若后面没有消息, 会再等待`OUTBOUND_COALESCE_WINDOW`秒以便合并,
+  `bot.send`对事件的回复不等待
+- 合并发送的各条消息得到同一个返回值, 即合并后那条消息的`message_id`, 撤回它会撤回整条;
+  需要单独撤回的消息请以`coalesce=False`发送
+- 实际发送经`accounts.router`记录, 失败时调用方收到原本的异常, 合并发送失败时同批的调用方都会收到;
+  self_id 统一转为 int, 回复(事件中的 int)与广播(`_wsr_api_clients`的 str 键)计入同一账号
+
+私聊等其他消息不经过这里.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+
+from hoshino import config, metrics
+from hoshino.accounts import router
+from hoshino.typing import Any, Deque, Dict, List, Message, MessageSegment, Optional, Set
+from hoshino.util import TokenBucket
+
+
+def _plain_text(message) -> Optional[str]:
+    """消息仅由文本段组成时返回其文本, 否则返回 None"""
+    try:
+        segs = Message(message)
+    except ValueError:
+        return None
+    if all(seg.type == 'text' for seg in segs):
+        return ''.join(seg.data['text'] for seg in segs)
+    return None
+
+
+class _Item:
+    __slots__ = ('self_id', 'message', 'kwargs', 'text', 'linger', 'future', 'enqueued')
+
+    def __init__(self, self_id, message, kwargs, coalesce, linger):
+        self.self_id = self_id
+        self.message = message
+        self.kwargs = kwargs
+        self.text = _plain_text(message) if coalesce and not kwargs else None     # 可合并时为纯文本
+        self.linger = linger
+        self.future = asyncio.get_event_loop().create_future()
+        self.enqueued = perf_counter()
+
+
+class OutboundPipeline:
+
+    def __init__(self, group_rate=1.0, group_burst=5, account_rate=10.0, account_burst=20,
+                 coalesce_window=0.05, coalesce_max_len=200):
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_len = coalesce_max_len
+        self._bot = None
+        self._queues: Dict[int, Deque[_Item]] = {}
+        self._workers: Set[asyncio.Future] = set()  # 持有 worker 的引用, 以免被回收
+        self._group_buckets: Dict[int, TokenBucket] = {}
+        self._account_buckets: Dict[Any, TokenBucket] = {}
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0           # 实际调用 API 的次数
+        self.coalesced = 0      # 被合并到前一条中的消息数
+        self.errors = 0
+        self.wait_time = metrics.Histogram()
+
+    def install(self, bot):
+        self._bot = bot
+
+        async def send_msg(**params):
+            if params.get('message_type', 'group' if 'group_id' in params else None) == 'group':
+                params.pop('message_type', None)
+                params.pop('user_id', None)     # `bot.send`会带上事件中的 user_id
+                return await self.send_group_msg(**params, linger=False)    # 回复事件, 不为合并而等待
+            return await bot.call_action('send_msg', **params)
+
+        @bot.before_sending
+        async def fill_self_id(event, message, kwargs):
+            # 消息在 worker 中发出, 不能再依赖事件上下文确定账号
+            if 'self_id' in event:
+                kwargs.setdefault('self_id', event.self_id)
+
+        bot.send_msg = send_msg
+        bot.send_group_msg = self.send_group_msg
+
+    async def send_group_msg(self, *, group_id, message, self_id=None, coalesce=True, linger=True, **kwargs):
+        """排队发送一条群消息, 参数同 OneBot API
+
+        @param coalesce: 为 False 时不与相邻消息合并
+        @param linger: 为 False 时出队后不等待后续消息合并, 但仍会与已在队列中的消息合并
+        @return: API 的返回值; 合并发送的各条消息返回值相同, 其`message_id`指向合并后的整条消息
+        """
+        if self_id is not None:
+            self_id = int(self_id)
+        item = _Item(self_id, message, kwargs, coalesce, linger)
+        q = self._queues.get(group_id)
+        if q is None:
+            q = self._queues[group_id] = deque()
+            worker = asyncio.ensure_future(self._worker(group_id, q))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        q.append(item)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, len(q))
+        return await item.future
+
+    def _bucket(self, buckets: Dict, key, rate, burst) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def _short(self, item: _Item) -> bool:
+        return item.text is not None and len(item.text) <= self.coalesce_max_len
+
+    async def _worker(self, group_id, q: Deque[_Item]):
+        try:
+            while q:
+                item = q.popleft()
+                self.depth -= 1
+                if item.future.done():
+                    continue    # 调用方已取消
+                await self._bucket(self._group_buckets, group_id, self.group_rate, self.group_burst).acquire()
+                batch = [item]
+                if self._short(item):
+                    if not q and item.linger and self.coalesce_window:
+                        await asyncio.sleep(self.coalesce_window)
+                    length = len(item.text)
+                    while q and self._short(q[0]) and q[0].self_id == item.self_id \
+                            and length + 1 + len(q[0].text) <= self.coalesce_max_len:
+                        nxt = q.popleft()
+                        self.depth -= 1
+                        if not nxt.future.done():
+                            batch.append(nxt)
+                            length += 1 + len(nxt.text)
+                await self._send(group_id, batch)
+        finally:
+            if self._queues.get(group_id) is q:
+                del self._queues[group_id]
+
+    async def _send(self, group_id, batch: List[_Item]):
+        head = batch[0]
+        if len(batch) == 1:
+            message = head.message
+        else:
+            message = Message(MessageSegment.text('\n'.join(i.text for i in batch)))
+        params = dict(head.kwargs, group_id=group_id, message=message)
+        if head.self_id is not None:
+            params['self_id'] = head.self_id
+        await self._bucket(self._account_buckets, head.self_id, self.account_rate, self.account_burst).acquire()
+        now = perf_counter()
+        for i in batch:
+            self.wait_time.observe(now - i.enqueued)
+        self.sent += 1
+        self.coalesced += len(batch) - 1
+        try:
+            with router.track(head.self_id) if head.self_id is not None else nullcontext():
+                result = await self._bot.call_action('send_group_msg', **params)
+        except Exception as e:
+            self.errors += 1
+            for i in batch:
+                if not i.future.done():
+                    i.future.set_exception(e)
+        else:
+            for i in batch:
+                if not i.future.done():
+                    i.future.set_result(result)
+
+    def collect(self) -> List[str]:
+        lines = [
+            '# TYPE hoshino_outbound_queue_depth gauge',
+            f'hoshino_outbound_queue_depth {self.depth}',
+            '# TYPE hoshino_outbound_queue_max_depth gauge',
+            f'hoshino_outbound_queue_max_depth {self.max_depth}',
+            '# TYPE hoshino_outbound_active_groups gauge',
+            f'hoshino_outbound_active_groups {len(self._queues)}',
+            '# TYPE hoshino_outbound_sent_total counter',
+            f'hoshino_outbound_sent_total {self.sent}',
+            '# TYPE hoshino_outbound_coalesced_total counter',
+            f'hoshino_outbound_coalesced_total {self.coalesced}',
+            '# TYPE hoshino_outbound_errors_total counter',
+            f'hoshino_outbound_errors_total {self.errors}',
+            '# TYPE hoshino_outbound_queue_wait_seconds histogram',
+        ]
+        metrics._render_histogram(lines, 'hoshino_outbound_queue_wait_seconds', self.wait_time)
+        return lines
+
+
+pipeline = OutboundPipeline(
+    group_rate=getattr(config, 'OUTBOUND_GROUP_RATE', 1.0),
+    group_burst=getattr(config, 'OUTBOUND_GROUP_BURST', 5),
+    account_rate=getattr(config, 'OUTBOUND_ACCOUNT_RATE', 10.0),
+    account_burst=getattr(config, 'OUTBOUND_ACCOUNT_BURST', 20),
+    coalesce_window=getattr(config, 'OUTBOUND_COALESCE_WINDOW', 0.05),
+    coalesce_max_len=getattr(config, 'OUTBOUND_COALESCE_MAX_LEN', 200),
+)
+metrics.collectors.append(pipeline.collect)
+
+
+def install(bot):
+    """由`hoshino.init`调用"""
+    pipeline.install(bot)
@@ -3,12 +3,22 @@
 `0` is for Default or NotSet. The other numbers may change in future versions.
 """
 
-from datetime import datetime
+import asyncio
+import atexit
+import heapq
+import os
+import time
+from datetime import timedelta
 
 import hoshino
-from hoshino import config
+from hoshino import config, log
 from hoshino.typing import CQEvent
 
+try:
+    import ujson as json
+except:
+    import json
+
 BLACK = -999
 DEFAULT = 0
 NORMAL = 1
@@ -19,32 +29,121 @@ WHITE = 51
 SUPERUSER = 999
 SU = SUPERUSER
 
-#===================== block list =======================#
-_black_group = {}  # Dict[group_id, expr_time]
-_black_user = {}  # Dict[user_id, expr_time]
-
+logger = log.new_logger('priv', config.DEBUG)
 
-def set_block_group(group_id, time):
-    _black_group[group_id] = datetime.now() + time
+#===================== block list =======================#
 
 
-def set_block_user(user_id, time):
+class _ExpiringSet:
+    """成员带有过期时间的集合, 以 time.monotonic 计时
+
+    过期时间另存于小根堆中, `sweep`只需弹出已过期的堆顶, 代价为 O(过期数);
+    成员判断只是一次 dict 查找, 不会构造 datetime.
+    """
+
+    def __init__(self):
+        self._deadline = {}  # {id: monotonic deadline}
+        self._heap = []      # [(deadline, id)], 可能含有被续期后作废的旧项
+
+    def add(self, key, seconds: float):
+        deadline = time.monotonic() + seconds
+        self._deadline[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+
+    def sweep(self):
+        heap = self._heap
+        if heap and heap[0][0] <= time.monotonic():
+            now = time.monotonic()
+            while heap and heap[0][0] <= now:
+                deadline, key = heapq.heappop(heap)
+                if self._deadline.get(key) == deadline:
+                    del self._deadline[key]
+
+    def __contains__(self, key) -> bool:
+        self.sweep()
+        return key in self._deadline
+
+    def remaining(self) -> dict:
+        """@return: {id: 剩余秒数}"""
+        self.sweep()
+        now = time.monotonic()
+        return {k: d - now for k, d in self._deadline.items()}
+
+
+_black_group = _ExpiringSet()
+_black_user = _ExpiringSet()
+
+# 拉黑名单的快照, 以墙上时间记录到期时刻, 重启后恢复
+_snapshot_file = os.path.expanduser('~/.hoshino/block_list.json')
+SNAPSHOT_DELAY = 5
+_snapshot_handle = None
+
+
+def _load_snapshot():
+    try:
+        with open(_snapshot_file, encoding='utf8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.exception(e)
+        return
+    now = time.time()
+    for key, blocked in (('group', _black_group), ('user', _black_user)):
+        for id_, expire in snapshot.get(key, {}).items():
+            if expire > now:
+                blocked.add(int(id_), expire - now)
+
+
+def _save_snapshot():
+    global _snapshot_handle
+    _snapshot_handle = None
+    now = time.time()
+    snapshot = {
+        'group': {id_: now + left for id_, left in _black_group.remaining().items()},
+        'user': {id_: now + left for id_, left in _black_user.remaining().items()},
+    }
+    tmp = _snapshot_file + '.tmp'
+    try:
+        with open(tmp, 'w', encoding='utf8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, _snapshot_file)
+    except Exception as e:
+        logger.exception(e)
+
+
+def _schedule_snapshot():
+    global _snapshot_handle
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _save_snapshot()
+        return
+    if _snapshot_handle is None:
+        _snapshot_handle = loop.call_later(SNAPSHOT_DELAY, _save_snapshot)
+
+
+_load_snapshot()
+atexit.register(_save_snapshot)
+
+
+def set_block_group(group_id, time: timedelta):
+    _black_group.add(group_id, time.total_seconds())
+    _schedule_snapshot()
+
+
+def set_block_user(user_id, time: timedelta):
     if user_id not in hoshino.config.SUPERUSERS:
-        _black_user[user_id] = datetime.now() + time
+        _black_user.add(user_id, time.total_seconds())
+        _schedule_snapshot()
 
 
 def check_block_group(group_id):
-    if group_id in _black_group and datetime.now() > _black_group[group_id]:
-        del _black_group[group_id]  # 拉黑时间过期
-        return False
-    return bool(group_id in _black_group)
+    return group_id in _black_group
 
 
 def check_block_user(user_id):
-    if user_id in _black_user and datetime.now() > _black_user[user_id]:
-        del _black_user[user_id]  # 拉黑时间过期
-        return False
-    return bool(user_id in _black_user)
+    return user_id in _black_user
 
 
 #========================================================#
@@ -1,9 +1,13 @@
 import asyncio
+import atexit
 import os
-import random
 import re
+import sqlite3
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from time import perf_counter
 
 import nonebot
 import pytz
@@ -11,7 +15,8 @@ from nonebot.command import SwitchException, _FinishException, _PauseException
 from nonebot.message import CanceledException
 
 import hoshino
-from hoshino import log, priv, trigger
+from hoshino import broadcast, executor, grouplist, log, metrics, multiplexer, priv, trigger
+from hoshino.multiplexer import OnMessageFunc
 from hoshino.typing import *
 
 try:
@@ -24,38 +29,133 @@ _loaded_services: Dict[str, "Service"] = {}  # {name: service}
 _service_bundle: Dict[str, List["Service"]] = defaultdict(list)
 _re_illegal_char = re.compile(r'[\\/:*?"<>|\.]')
 _service_config_dir = os.path.expanduser('~/.hoshino/service_config/')
+_service_config_db = os.path.expanduser('~/.hoshino/service_config.db')
 os.makedirs(_service_config_dir, exist_ok=True)
 
 
+class _ServiceConfigStore:
+    """所有服务配置的统一存储 (sqlite, WAL 模式)
+
+    启动时一次性读入全部配置; `save`只记录脏服务, 延迟`SAVE_DELAY`秒后在线程池中
+    以单个事务批量写入, 避免批量开关服务时在事件循环上反复重写文件.
+    旧版`service_config/{name}.json`中尚未入库的配置会在启动时自动导入.
+    """
+    SAVE_DELAY = 1.0
+
+    def __init__(self, db_path, json_dir):
+        self._json_dir = json_dir
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)  # 单线程保证各批次按顺序提交
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS service_config (name TEXT PRIMARY KEY, config TEXT NOT NULL)')
+        self._configs = {}
+        for name, config in self._conn.execute('SELECT name, config FROM service_config'):
+            try:
+                self._configs[name] = json.loads(config)
+            except Exception as e:
+                hoshino.logger.exception(e)
+        self._import_json()
+        self._dirty: Dict[str, "Service"] = {}
+        self._flush_handle = None
+        atexit.register(self.flush_now)
+
+    def _import_json(self):
+        rows = []
+        for filename in os.listdir(self._json_dir):
+            name, ext = os.path.splitext(filename)
+            if ext != '.json' or name in self._configs:
+                continue
+            try:
+                with open(os.path.join(self._json_dir, filename), encoding='utf8') as f:
+                    config = json.load(f)
+            except Exception as e:
+                hoshino.logger.exception(e)
+                continue
+            self._configs[name] = config
+            rows.append((name, json.dumps(config, ensure_ascii=False)))
+        if rows:
+            self._write(rows)
+            hoshino.logger.info(f'Imported {len(rows)} service config(s) from {self._json_dir}')
+
+    def load(self, service_name) -> dict:
+        return self._configs.get(service_name, {})
+
+    def save(self, service: "Service"):
+        self._dirty[service.name] = service
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_now()    # 不在事件循环中 (如启动阶段), 直接写入
+            return
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.SAVE_DELAY, self._flush_later, loop)
+
+    def _take_dirty(self):
+        dirty, self._dirty = self._dirty, {}
+        rows = []
+        for name, service in dirty.items():
+            config = _dump_service_config(service)
+            self._configs[name] = config
+            rows.append((name, json.dumps(config, ensure_ascii=False)))
+        return rows
+
+    def _flush_later(self, loop):
+        self._flush_handle = None
+        rows = self._take_dirty()
+        if rows:
+            loop.run_in_executor(self._executor, self._write, rows)
+
+    def flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        rows = self._take_dirty()
+        if rows:
+            self._write(rows)
+
+    def _write(self, rows):
+        with self._lock:
+            try:
+                self._conn.execute('BEGIN')
+                self._conn.executemany('INSERT OR REPLACE INTO service_config (name, config) VALUES (?, ?)', rows)
+                self._conn.execute('COMMIT')
+            except Exception as e:
+                self._conn.execute('ROLLBACK')
+                hoshino.logger.error(f'Failed to save service config: {type(e)}')
+                hoshino.logger.exception(e)
+
+
+def _dump_service_config(service) -> dict:
+    return {
+        "name": service.name,
+        "use_priv": service.use_priv,
+        "manage_priv": service.manage_priv,
+        "enable_on_default": service.enable_on_default,
+        "visible": service.visible,
+        "priority": service.priority,
+        "enable_group": list(service.enable_group),
+        "disable_group": list(service.disable_group)
+    }
+
+
+_store = None
+
+
+def _get_store() -> _ServiceConfigStore:
+    global _store
+    if _store is None:
+        _store = _ServiceConfigStore(_service_config_db, _service_config_dir)
+    return _store
+
+
 def _load_service_config(service_name):
-    config_file = os.path.join(_service_config_dir, f'{service_name}.json')
-    if not os.path.exists(config_file):
-        return {}  # config file not found, return default config.
-    try:
-        with open(config_file, encoding='utf8') as f:
-            config = json.load(f)
-            return config
-    except Exception as e:
-        hoshino.logger.exception(e)
-        return {}
+    return _get_store().load(service_name)
 
 
 def _save_service_config(service):
-    config_file = os.path.join(_service_config_dir, f'{service.name}.json')
-    with open(config_file, 'w', encoding='utf8') as f:
-        json.dump(
-            {
-                "name": service.name,
-                "use_priv": service.use_priv,
-                "manage_priv": service.manage_priv,
-                "enable_on_default": service.enable_on_default,
-                "visible": service.visible,
-                "enable_group": list(service.enable_group),
-                "disable_group": list(service.disable_group)
-            },
-            f,
-            ensure_ascii=False,
-            indent=2)
+    _get_store().save(service)
 
 
 class ServiceFunc:
@@ -89,18 +189,20 @@ class Service:
         "manage_priv": priv.ADMIN,
         "enable_on_default": true/false,
         "visible": true/false,
+        "priority": "critical"/"normal"/"best_effort",
         "enable_group": [],
         "disable_group": []
     }
 
     储存位置：
-    `~/.hoshino/service_config/{ServiceName}.json`
+    `~/.hoshino/service_config.db` (旧版的`~/.hoshino/service_config/{ServiceName}.json`会自动导入)
     """
     def __init__(self, name, use_priv=None, manage_priv=None, enable_on_default=None, visible=None,
-                 help_=None, bundle=None):
+                 help_=None, bundle=None, priority=None):
         """
         定义一个服务
         配置的优先级别：配置文件 > 程序指定 > 缺省值
+        `priority`取`hoshino.executor`中的`CRITICAL`/`NORMAL`/`BEST_EFFORT`, 决定高负载时的舍弃顺序, `BEST_EFFORT`最先被舍弃, `CRITICAL`永不舍弃
         """
         assert not _re_illegal_char.search(name), r'Service name cannot contain character in `\/:*?"<>|.`'
 
@@ -119,6 +221,8 @@ class Service:
             self.visible = visible
         if self.visible is None:
             self.visible = True
+        self.priority = config.get('priority') or priority or executor.NORMAL
+        assert self.priority in executor.PRIORITIES, f'Service priority should be one of {executor.PRIORITIES}'
         self.help = help_
         self.enable_group = set(config.get('enable_group', []))
         self.disable_group = set(config.get('disable_group', []))
@@ -145,12 +249,16 @@ class Service:
         self.enable_group.add(group_id)
         self.disable_group.discard(group_id)
         _save_service_config(self)
+        trigger.invalidate(group_id)
+        multiplexer.invalidate(group_id)
         self.logger.info(f'Service {self.name} is enabled at group {group_id}')
 
     def set_disable(self, group_id):
         self.enable_group.discard(group_id)
         self.disable_group.add(group_id)
         _save_service_config(self)
+        trigger.invalidate(group_id)
+        multiplexer.invalidate(group_id)
         self.logger.info(
             f'Service {self.name} is disabled at group {group_id}')
 
@@ -167,34 +275,25 @@ class Service:
 
         @return { group_id: [self_id1, self_id2] }
         """
-        gl = defaultdict(list)
-        for sid in hoshino.get_self_ids():
-            try:
-                sgl = await self.bot.get_group_list(self_id=sid)
-            except CQHttpError:
-                sgl = []
-            sgl = set(g['group_id'] for g in sgl)
-            if self.enable_on_default:
-                sgl = sgl - self.disable_group
-            else:
-                sgl = sgl & self.enable_group
-            for g in sgl:
-                gl[g].append(sid)
-        return gl
+        gl = await grouplist.get_groups()
+        if self.enable_on_default:
+            return {g: sids for g, sids in gl.items() if g not in self.disable_group}
+        else:
+            return {g: sids for g, sids in gl.items() if g in self.enable_group}
 
 
-    def on_message(self, event='group') -> Callable:
+    def on_message(self, event='group', *, startswith: Union[str, Tuple[str, ...]] = None,
+                   when: Callable[[CQEvent], bool] = None, probability: float = 1.0) -> Callable:
+        """
+        所有服务的`on_message`经`hoshino.multiplexer`统一分发, 仅在启用本服务的群内调用.
+        可声明前置过滤, 未通过的消息不会调用`func`:
+        `startswith`: 首个文本段(去除前导空白)须以此开头, 可为 str 或 tuple
+        `when(ev)`: 返回 False 时跳过, 如`lambda ev: gm.is_playing(ev.group_id)`; 不一定每条消息都会调用, 须无副作用
+        `probability`: 以该概率采样调用
+        """
         def deco(func) -> Callable:
-            @wraps(func)
-            async def wrapper(ctx):
-                if self._check_all(ctx):
-                    try:
-                        return await func(self.bot, ctx)
-                    except Exception as e:
-                        self.logger.error(f'{type(e)} occured when {func.__name__} handling message {ctx["message_id"]}.')
-                        self.logger.exception(e)
-                    return
-            return self.bot.on_message(event)(wrapper)
+            multiplexer.get(event).add(OnMessageFunc(self, func, startswith, when, probability))
+            return func
         return deco
 
 
@@ -216,28 +315,13 @@ class Service:
         if len(word) == 1 and not isinstance(word[0], str):
             word = word[0]
         def deco(func) -> Callable:
-            @wraps(func)
-            async def wrapper(bot: HoshinoBot, event: CQEvent):
-                if len(event.message) != 1 or event.message[0].data.get('text'):
-                    self.logger.info(f'Message {event.message_id} is ignored by fullmatch condition.')
-                    return
-                return await func(bot, event)
-            sf = ServiceFunc(self, wrapper, only_to_me)
+            sf = ServiceFunc(self, func, only_to_me)
             for w in word:
                 if isinstance(w, str):
-                    trigger.prefix.add(w, sf)
+                    trigger.fullmatch.add(w, sf)
                 else:
                     self.logger.error(f'Failed to add fullmatch trigger `{w}`, expecting `str` but `{type(w)}` given!')
             return func
-            # func itself is still func, not wrapper. wrapper is a part of trigger.
-            # so that we could use multi-trigger freely, regardless of the order of decorators.
-            # ```
-            # """the order doesn't matter"""
-            # @on_keyword(...)
-            # @on_fullmatch(...)
-            # async def func(...):
-            #   ...
-            # ```
         return deco
 
 
@@ -344,35 +428,33 @@ class Service:
         def deco(func: Callable[[], Any]) -> Callable:
             @wraps(func)
             async def wrapper():
+                error = False
+                start = perf_counter()
                 try:
                     self.logger.info(f'Scheduled job {func.__name__} start.')
                     ret = await func()
                     self.logger.info(f'Scheduled job {func.__name__} completed.')
                     return ret
                 except Exception as e:
+                    error = True
                     self.logger.error(f'{type(e)} occured when doing scheduled job {func.__name__}.')
                     self.logger.exception(e)
+                finally:
+                    metrics.observe_handler(self.name, func.__name__, 'scheduled_job', perf_counter() - start, error)
             return nonebot.scheduler.scheduled_job(*args, **kwargs)(wrapper)
         return deco
 
 
     async def broadcast(self, msgs, TAG='', interval_time=0.5, randomiser=None):
-        bot = self.bot
+        """向所有启用本服务的群并发投递`msgs`, 同一群内相邻两条消息间隔`interval_time`秒
+
+        @return: `hoshino.broadcast.BroadcastStats`
+        """
         if isinstance(msgs, (str, MessageSegment, Message)):
             msgs = (msgs, )
         groups = await self.get_enable_groups()
-        for gid, selfids in groups.items():
-            try:
-                for msg in msgs:
-                    await asyncio.sleep(interval_time)
-                    msg = randomiser(msg) if randomiser else msg
-                    await bot.send_group_msg(self_id=random.choice(selfids), group_id=gid, message=msg)
-                l = len(msgs)
-                if l:
-                    self.logger.info(f"群{gid} 投递{TAG}成功 共{l}条消息")
-            except Exception as e:
-                self.logger.error(f"群{gid} 投递{TAG}失败：{type(e)}")
-                self.logger.exception(e)
+        return await broadcast.broadcaster.broadcast(
+            groups, msgs, TAG, interval_time, randomiser, name=self.name, log_to=self.logger)
 
 
     def on_request(self, *events):
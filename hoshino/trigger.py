@@ -1,47 +1,129 @@
 import re
 from collections import defaultdict
 
-import pygtrie
-import zhconv
+try:
+    from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_parse
+
+import operator
+from time import perf_counter
 
 import hoshino
-from hoshino import util
-from hoshino.typing import CQEvent, List
+from hoshino import metrics, msgfields, util
+from hoshino.typing import CQEvent, Dict, FrozenSet, Iterable, Iterator, List, Optional
+from hoshino.util import hans
+from hoshino.util.ahocorasick import Automaton
+from hoshino.util.trie import FrozenTrie
 
 
 class BaseTrigger:
-    def add(self, x, sf: "ServiceFunc"):
+    def __init__(self):
+        self._entries = []  # [(x, sf)] 按注册顺序保存
+
+    def add(self, x, sf: "ServiceFunc") -> bool:
+        """@return: 触发条件`x`是否为首次添加"""
+        is_new = self._add(x, sf)
+        self._entries.append((x, sf))
+        invalidate()
+        return is_new
+
+    def _add(self, x, sf: "ServiceFunc") -> bool:
         raise NotImplementedError
 
-    def find_handler(self, event: CQEvent) -> List["ServiceFunc"]:
+    def compile(self):
+        """在全部插件加载完毕后调用, 用于预先构建匹配所需的数据结构"""
+        pass
+
+    def find_handler(self, event: CQEvent, services: Optional[FrozenSet] = None) -> Iterable["ServiceFunc"]:
+        """@param services: 只产出这些服务的 ServiceFunc, 为 None 时不限"""
         raise NotImplementedError
 
 
+def _filter(sfs: List["ServiceFunc"], services: Optional[FrozenSet]) -> List["ServiceFunc"]:
+    return sfs if services is None else [sf for sf in sfs if sf.sv in services]
+
+
+class FullmatchTrigger(BaseTrigger):
+    """整条消息与触发词相同时触发
+
+    比较前双方都经`util.normalize_str`规范化, 因此不区分大小写、全角半角与简繁;
+    消息须恰为一个文本段, 带图片、at 等其他消息段的消息不会触发
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.allword = {}  # {normalized word: [sf]}
+
+    def add(self, word: str, sf: "ServiceFunc"):
+        if super().add(word, sf):
+            hoshino.logger.debug(f"Succeed to add fullmatch trigger `{word}`")
+        else:
+            hoshino.logger.warning(f"Fullmatch trigger `{word}` added multiple handlers: {sf.__name__}@{sf.sv.name}")
+
+    def _add(self, word: str, sf: "ServiceFunc") -> bool:
+        word = util.normalize_str(word.strip())
+        if word in self.allword:
+            self.allword[word].append(sf)
+            return False
+        else:
+            self.allword[word] = [sf]
+            return True
+
+    def find_handler(self, event: CQEvent, services: Optional[FrozenSet] = None) -> List["ServiceFunc"]:
+        if len(event.message) != 1 or event.message[0].type != "text":
+            return []
+        msg_seg = event.message[0]
+        text = msg_seg.data["text"].strip()
+        # 规范化可能改变长度(如半角片假名与浊点合为一字), 不能在此之前按长度排除
+        sfs = _filter(self.allword.get(util.normalize_str(text), []), services)
+        if not sfs:
+            return []
+
+        event["prefix"] = text
+        msg_seg.data["text"] = ""
+        msgfields.invalidate(event)
+        return sfs
+
+
 class PrefixTrigger(BaseTrigger):
     def __init__(self):
         super().__init__()
-        self.trie = pygtrie.CharTrie()
+        self.allprefix = {}  # {prefix: [sf]}
+        self.trie = None
 
     def add(self, prefix: str, sf: "ServiceFunc"):
-        prefix_cht = zhconv.convert(prefix, "zh-hant")
-        if prefix in self.trie:
-            self.trie[prefix].append(sf)
-            if prefix_cht != prefix:
-                self.trie[prefix_cht].append(sf)
+        if super().add(prefix, sf):
+            hoshino.logger.debug(f"Succeed to add prefix trigger `{prefix}`")
+        else:
             hoshino.logger.warning(f"Prefix trigger `{prefix}` added multiple handlers: {sf.__name__}@{sf.sv.name}")
+
+    def _add(self, prefix: str, sf: "ServiceFunc") -> bool:
+        self.trie = None
+        if prefix in self.allprefix:
+            self.allprefix[prefix].append(sf)
+            return False
         else:
-            self.trie[prefix] = [sf]
-            if prefix_cht != prefix:
-                self.trie[prefix_cht] = [sf]
-            hoshino.logger.debug(f"Succeed to add prefix trigger `{prefix}`")
+            self.allprefix[prefix] = [sf]
+            return True
 
-    def find_handler(self, event: CQEvent) -> List["ServiceFunc"]:
+    def compile(self):
+        # 以繁转简单字表折叠, 一份索引同时匹配简繁两种写法
+        self.trie = FrozenTrie(self.allprefix, fold=hans.char_table(), merge=operator.add)
+
+    def find_handler(self, event: CQEvent, services: Optional[FrozenSet] = None) -> List["ServiceFunc"]:
         first_msg_seg = event.message[0]
         if first_msg_seg.type != "text":
             return []
         first_text = first_msg_seg.data["text"].lstrip()
-        item = self.trie.longest_prefix(first_text)
-        if not item:
+        if self.trie is None:
+            self.compile()
+        # 最长的前缀不属于可用的服务时, 退而使用较短的前缀
+        for item in self.trie.prefixes(first_text):
+            sfs = _filter(item.value, services)
+            if sfs:
+                break
+        else:
             return []
 
         event["prefix"] = item.key
@@ -50,35 +132,47 @@ class PrefixTrigger(BaseTrigger):
             del event.message[0]
         else:
             first_msg_seg.data["text"] = first_text
-        return item.value
+        msgfields.invalidate(event)
+        return sfs
 
 
 class SuffixTrigger(BaseTrigger):
     def __init__(self):
         super().__init__()
-        self.trie = pygtrie.CharTrie()
+        self.allsuffix = {}  # {reversed suffix: [sf]}
+        self.trie = None
 
     def add(self, suffix: str, sf: "ServiceFunc"):
-        suffix_r = suffix[::-1]
-        suffix_r_cht = zhconv.convert(suffix_r, "zh-hant")
-        if suffix_r in self.trie:
-            self.trie[suffix_r].append(sf)
-            if suffix_r_cht != suffix_r:
-                self.trie[suffix_r_cht].append(sf)
+        if super().add(suffix, sf):
+            hoshino.logger.debug(f"Succeed to add suffix trigger `{suffix}`")
+        else:
             hoshino.logger.warning(f"Suffix trigger `{suffix}` added multi handler: `{sf.__name__}`")
+
+    def _add(self, suffix: str, sf: "ServiceFunc") -> bool:
+        suffix_r = suffix[::-1]
+        self.trie = None
+        if suffix_r in self.allsuffix:
+            self.allsuffix[suffix_r].append(sf)
+            return False
         else:
-            self.trie[suffix_r] = [sf]
-            if suffix_r_cht != suffix_r:
-                self.trie[suffix_r_cht] = [sf]
-            hoshino.logger.debug(f"Succeed to add suffix trigger `{suffix}`")
+            self.allsuffix[suffix_r] = [sf]
+            return True
 
-    def find_handler(self, event: CQEvent) -> List["ServiceFunc"]:
+    def compile(self):
+        self.trie = FrozenTrie(self.allsuffix, fold=hans.char_table(), merge=operator.add)
+
+    def find_handler(self, event: CQEvent, services: Optional[FrozenSet] = None) -> List["ServiceFunc"]:
         last_msg_seg = event.message[-1]
         if last_msg_seg.type != "text":
             return []
         last_text = last_msg_seg.data["text"].rstrip()
-        item = self.trie.longest_prefix(last_text[::-1])
-        if not item:
+        if self.trie is None:
+            self.compile()
+        for item in self.trie.prefixes(last_text[::-1]):
+            sfs = _filter(item.value, services)
+            if sfs:
+                break
+        else:
             return []
 
         event["suffix"] = item.key[::-1]
@@ -87,76 +181,269 @@ class SuffixTrigger(BaseTrigger):
             del event.message[-1]
         else:
             last_msg_seg.data["text"] = last_text
-        return item.value
+        msgfields.invalidate(event)
+        return sfs
 
 
 class KeywordTrigger(BaseTrigger):
     def __init__(self):
         super().__init__()
         self.allkw = {}
+        self._norm_ac = None
+        self._raw_ac = None
 
     def add(self, keyword: str, sf: "ServiceFunc"):
+        if super().add(keyword, sf):
+            hoshino.logger.debug(f"Succeed to add keyword trigger `{keyword}`")
+        else:
+            hoshino.logger.warning(f"Keyword trigger `{keyword}` added multi handler: `{sf.__name__}`")
+
+    def _add(self, keyword: str, sf: "ServiceFunc") -> bool:
         if sf.normalize_text:
             keyword = util.normalize_str(keyword)
+        self._norm_ac = self._raw_ac = None
         if keyword in self.allkw:
             self.allkw[keyword].append(sf)
-            hoshino.logger.warning(f"Keyword trigger `{keyword}` added multi handler: `{sf.__name__}`")
+            return False
         else:
             self.allkw[keyword] = [sf]
-            hoshino.logger.debug(f"Succeed to add keyword trigger `{keyword}`")
+            return True
 
-    def find_handler(self, event: CQEvent) -> List["ServiceFunc"]:
-        ret = []
-        for kw, sfs in self.allkw.items():
-            for sf in sfs:
-                text = event.norm_text if sf.normalize_text else event.plain_text
-                if kw in text:
-                    ret.append(sf)
-        return ret
+    def compile(self):
+        # 按 normalize_text 分别建立自动机, value 为关键词的注册序号, 以保持原有的触发优先级
+        norm_ac, raw_ac = Automaton(), Automaton()
+        always = set()
+        for i, (kw, sfs) in enumerate(self.allkw.items()):
+            if not kw:
+                always.add(i)  # 空关键词匹配任何消息
+                continue
+            if any(sf.normalize_text for sf in sfs):
+                norm_ac.add(kw, i)
+            if not all(sf.normalize_text for sf in sfs):
+                raw_ac.add(kw, i)
+        norm_ac.build()
+        raw_ac.build()
+        self._sfs = list(self.allkw.values())
+        self._always = always
+        self._has_norm = any(sf.normalize_text for sfs in self._sfs for sf in sfs)
+        self._has_raw = not all(sf.normalize_text for sfs in self._sfs for sf in sfs)
+        self._norm_ac, self._raw_ac = norm_ac, raw_ac
+
+    def find_handler(self, event: CQEvent, services: Optional[FrozenSet] = None) -> Iterator["ServiceFunc"]:
+        if not self.allkw:
+            return
+        if self._norm_ac is None:
+            self.compile()
+        norm_hits = self._norm_ac.findall(_norm_text(event)) | self._always if self._has_norm else self._always
+        raw_hits = self._raw_ac.findall(_plain_text(event)) | self._always if self._has_raw else self._always
+        for i in sorted(norm_hits | raw_hits):
+            for sf in self._sfs[i]:
+                if services is not None and sf.sv not in services:
+                    continue
+                if i in (norm_hits if sf.normalize_text else raw_hits):
+                    yield sf
+
+
+def _iter_flat(items, ignorecase: bool):
+    """展开 sre 语法树中的分组, 产出 `(op, av, ignorecase)`"""
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, p = av
+            ic = (ignorecase or bool(add_flags & sre_parse.SRE_FLAG_IGNORECASE)) \
+                and not del_flags & sre_parse.SRE_FLAG_IGNORECASE
+            yield from _iter_flat(p, ic)
+        else:
+            yield op, av, ignorecase
+
+
+def _caseless(ch: str) -> bool:
+    return ch.lower() == ch == ch.upper()
+
+
+def _extract_literals(items, ignorecase: bool) -> List[str]:
+    """提取匹配成功时文本中必然出现的字面量片段"""
+    lits = []
+    run = []
+    def flush():
+        if run:
+            lits.append(''.join(run))
+            run.clear()
+    for op, av, ic in _iter_flat(items, ignorecase):
+        if op is sre_parse.LITERAL:
+            if ic and not _caseless(chr(av)):
+                flush()  # 忽略大小写时, 只有无大小写之分的字符可作为字面量
+                continue
+            run.append(chr(av))
+            continue
+        flush()
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None):
+            lo, _, p = av
+            if lo >= 1:
+                lits.extend(_extract_literals(p, ic))
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            lits.extend(_extract_literals(av, ic))
+    flush()
+    return lits
+
+
+def _analyze_rex(rex: re.Pattern):
+    """@return: (anchor, literal) 锚定在开头的字面量前缀, 与最长的必需字面量. 均可能为空串"""
+    try:
+        items = list(sre_parse.parse(rex.pattern, rex.flags))
+    except Exception:
+        return '', ''
+    ignorecase = bool(rex.flags & re.IGNORECASE)
+    anchor = ''
+    if items[:1] == [(sre_parse.AT, sre_parse.AT_BEGINNING_STRING)] \
+            or items[:1] == [(sre_parse.AT, sre_parse.AT_BEGINNING)] and not rex.flags & re.MULTILINE:
+        for op, av, ic in _iter_flat(items[1:], ignorecase):
+            if op is not sre_parse.LITERAL or ic and not _caseless(chr(av)):
+                break
+            anchor += chr(av)
+    literals = _extract_literals(items, ignorecase)
+    literal = max(literals, key=len) if literals else ''
+    return anchor, literal
 
 
 class RexTrigger(BaseTrigger):
     def __init__(self):
         super().__init__()
         self.allrex = defaultdict(list)
+        self._prefilter = None
 
     def add(self, rex: re.Pattern, sf: "ServiceFunc"):
-        self.allrex[rex].append(sf)
+        super().add(rex, sf)
         hoshino.logger.debug(f"Succeed to add rex trigger `{rex.pattern}`")
 
-    def find_handler(self, event: CQEvent) -> "ServiceFunc":
-        ret = []
-        for rex, sfs in self.allrex.items():
+    def _add(self, rex: re.Pattern, sf: "ServiceFunc") -> bool:
+        is_new = rex not in self.allrex
+        self.allrex[rex].append(sf)
+        self._prefilter = None
+        return is_new
+
+    def compile(self):
+        # 仅当正则的必需字面量出现在文本中时, 才真正执行 rex.search
+        ac = Automaton()
+        anchored = []
+        always = set()
+        for i, rex in enumerate(self.allrex):
+            anchor, literal = _analyze_rex(rex)
+            if anchor:
+                anchored.append((i, anchor))
+            elif literal:
+                ac.add(literal, i)
+            else:
+                always.add(i)
+        ac.build()
+        self._compiled = list(self.allrex.items())
+        self._has_raw = any(not sf.normalize_text for sfs in self.allrex.values() for sf in sfs)
+        self._has_norm = any(sf.normalize_text for sfs in self.allrex.values() for sf in sfs)
+        self._prefilter = (ac, anchored, always)
+
+    def _candidates(self, text: str):
+        ac, anchored, always = self._prefilter
+        cand = ac.findall(text)
+        cand.update(always)
+        cand.update(i for i, anchor in anchored if text.startswith(anchor))
+        return cand
+
+    def find_handler(self, event: CQEvent, services: Optional[FrozenSet] = None) -> Iterator["ServiceFunc"]:
+        if not self.allrex:
+            return
+        if self._prefilter is None:
+            self.compile()
+        norm_cand = self._candidates(_norm_text(event)) if self._has_norm else set()
+        raw_cand = self._candidates(_plain_text(event)) if self._has_raw else set()
+        for i in sorted(norm_cand | raw_cand):
+            rex, sfs = self._compiled[i]
+            cache = {}
             for sf in sfs:
-                text = event.norm_text if sf.normalize_text else event.plain_text
-                match = rex.search(text)
-                if match:
-                    event["match"] = match
-                    ret.append(sf)
-        return ret
+                if services is not None and sf.sv not in services:
+                    continue    # 在执行正则之前排除
+                norm = sf.normalize_text
+                if i not in (norm_cand if norm else raw_cand):
+                    continue
+                if norm not in cache:
+                    cache[norm] = rex.search(_norm_text(event) if norm else _plain_text(event))
+                if cache[norm]:
+                    event["match"] = cache[norm]  # 惰性产出, 每个 ServiceFunc 被调用时 event["match"] 都是它自己的
+                    yield sf
 
 
-class _PlainTextExtractor(BaseTrigger):
-    def find_handler(self, event: CQEvent):
-        event.plain_text = event.message.extract_plain_text().strip()
-        return []
+def _plain_text(event: CQEvent) -> str:
+    return msgfields.get(event).plain_text
 
-class _TextNormalizer(_PlainTextExtractor):
-    def find_handler(self, event: CQEvent):
-        super().find_handler(event)
-        event.norm_text = util.normalize_str(event.plain_text)
-        return []
 
+def _norm_text(event: CQEvent) -> str:
+    return msgfields.get(event).norm_text
 
+
+fullmatch = FullmatchTrigger()
 prefix = PrefixTrigger()
 suffix = SuffixTrigger()
 keyword = KeywordTrigger()
 rex = RexTrigger()
 
 chain: List[BaseTrigger] = [
+    fullmatch,
     prefix,
     suffix,
-    _TextNormalizer(),
     rex,
     keyword,
 ]
+
+
+def iter_handlers(event: CQEvent, triggers: Iterable[BaseTrigger] = chain,
+                  services: Optional[FrozenSet] = None) -> Iterator["ServiceFunc"]:
+    """按优先级惰性地产出候选 ServiceFunc
+
+    调用方取到能处理消息的 ServiceFunc 后即可停止迭代, 之后的阶段不会再执行;
+    纯文本与规范化文本也只在有阶段需要时才计算
+
+    @param services: 只产出这些服务的 ServiceFunc, 见`enabled_services`
+    """
+    for t in triggers:
+        # 只统计阶段自身的匹配耗时, 不含调用方处理候选的时间
+        stage = type(t).__name__
+        elapsed = 0.0
+        hit = False
+        it = iter(t.find_handler(event, services))
+        try:
+            while True:
+                start = perf_counter()
+                sf = next(it, None)
+                elapsed += perf_counter() - start
+                if sf is None:
+                    break
+                hit = True
+                yield sf
+        finally:
+            metrics.observe_stage(stage, elapsed, hit)
+
+
+_group_services: Dict[int, FrozenSet] = {}
+_services = None
+
+
+def enabled_services(group_id) -> FrozenSet:
+    """本群启用的服务, 传给`iter_handlers`后未启用的服务在匹配时即被跳过
+
+    各触发器只有一份全局索引, 命中后按此集合过滤, 不为各群另建索引
+    """
+    global _services
+    enabled = _group_services.get(group_id)
+    if enabled is None:
+        if _services is None:
+            _services = {sf.sv for t in chain for _, sf in t._entries}
+        enabled = _group_services[group_id] = frozenset(sv for sv in _services if sv.check_enabled(group_id))
+    return enabled
+
+
+def invalidate(group_id=None):
+    """群的服务启用状态变化后调用; 不指定`group_id`时丢弃全部群的记录"""
+    global _services
+    if group_id is None:
+        _group_services.clear()
+        _services = None
+    else:
+        _group_services.pop(group_id, None)
@@ -1,4 +1,4 @@
-from typing import (Any, Callable, Dict, Iterable, List, NamedTuple, Optional,
+from typing import (Any, Awaitable, Callable, Deque, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional,
                     Set, Tuple, Union)
 
 from aiocqhttp import Event as CQEvent
@@ -1,21 +1,22 @@
+import asyncio
 import base64
 import os
 import time
 import unicodedata
 from collections import defaultdict
+from functools import lru_cache
 from datetime import datetime, timedelta
 from io import BytesIO
 
 import pytz
-import zhconv
 from aiocqhttp.exceptions import ActionFailed
 from aiocqhttp.message import escape
-from matplotlib import pyplot as plt
-from PIL import Image
 
 import hoshino
 from hoshino.typing import CQEvent, Message, Union
 
+from .hans import to_hans
+
 try:
     import ujson as json
 except:
@@ -62,14 +63,14 @@ async def silence(ev: CQEvent, ban_time, skip_su=True):
         hoshino.logger.exception(e)
 
 
-def pic2b64(pic: Image) -> str:
+def pic2b64(pic: "PIL.Image.Image") -> str:
     buf = BytesIO()
     pic.save(buf, format='PNG')
     base64_str = base64.b64encode(buf.getvalue()).decode()
     return 'base64://' + base64_str
 
 
-def fig2b64(plt: plt) -> str:
+def fig2b64(plt: "matplotlib.pyplot") -> str:
     buf = BytesIO()
     plt.savefig(buf, format='PNG', dpi=100)
     base64_str = base64.b64encode(buf.getvalue()).decode()
@@ -77,6 +78,7 @@ def fig2b64(plt: plt) -> str:
 
 
 def concat_pic(pics, border=5):
+    from PIL import Image
     num = len(pics)
     w, h = pics[0].size
     des = Image.new('RGBA', (w, num * h + (num-1) * border), (255, 255, 255, 255))
@@ -85,14 +87,34 @@ def concat_pic(pics, border=5):
     return des
 
 
+def _normalize_str(string) -> str:
+    if string.isascii():
+        return string.lower()   # NFKC 不改变 ASCII 字符
+    string = unicodedata.normalize('NFKC', string)
+    string = string.lower()
+    string = to_hans(string)
+    return string
+
+
+NORMALIZE_CACHE_SIZE = 8192
+NORMALIZE_CACHE_MAX_LEN = 64
+_normalize_str_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize_str)
+
+
 def normalize_str(string) -> str:
     """
     规范化unicode字符串 并 转为小写 并 转为简体
+
+    短字符串(角色名、指令词、复读的聊天)的结果会被缓存, 命中情况见`normalize_cache_info()`
     """
-    string = unicodedata.normalize('NFKC', string)
-    string = string.lower()
-    string = zhconv.convert(string, 'zh-hans')
-    return string
+    if len(string) > NORMALIZE_CACHE_MAX_LEN:
+        return _normalize_str(string)
+    return _normalize_str_cached(string)
+
+
+def normalize_cache_info():
+    """@return: functools._CacheInfo(hits, misses, maxsize, currsize)"""
+    return _normalize_str_cached.cache_info()
 
 
 MONTH_NAME = ('睦月', '如月', '弥生', '卯月', '皐月', '水無月',
@@ -140,6 +162,40 @@ class FreqLimiter:
         return self.next_time[key] - time.time()
 
 
+class TokenBucket:
+    """令牌桶: 每秒补充`rate`个令牌, 至多积攒`capacity`个"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_acquire(self, n=1) -> bool:
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def wait_time(self, n=1) -> float:
+        """还需等待多少秒才有`n`个令牌"""
+        self._refill()
+        return max(0.0, (n - self.tokens) / self.rate)
+
+    async def acquire(self, n=1):
+        """取走`n`个令牌, 不足时先预支再等待补足, 因此并发的调用按先后顺序获得令牌"""
+        self._refill()
+        self.tokens -= n
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
 class DailyNumberLimiter:
     tz = pytz.timezone('Asia/Shanghai')
 
@@ -166,19 +222,35 @@ class DailyNumberLimiter:
         self.count[key] = 0
 
 
-from .textfilter.filter import DFAFilter
+from .textfilter.compiled import CompiledFilter
+
+_gfw = None
+
+
+def get_gfw() -> CompiledFilter:
+    """敏感词过滤器, 首次使用时才加载; 词表的编译结果缓存在`~/.hoshino/cache`"""
+    global _gfw
+    if _gfw is None:
+        _gfw = CompiledFilter.from_wordfile(
+            os.path.join(os.path.dirname(__file__), 'textfilter/sensitive_words.txt'),
+            os.path.expanduser('~/.hoshino/cache'))
+    return _gfw
+
 
-gfw = DFAFilter()
-gfw.parse(os.path.join(os.path.dirname(__file__), 'textfilter/sensitive_words.txt'))
+def __getattr__(name):
+    if name == 'gfw':   # 兼容旧代码对 util.gfw 的直接引用
+        return get_gfw()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def filt_message(message: Union[Message, str]):
+    gfw = get_gfw()
     if isinstance(message, str):
         return gfw.filter(message)
     elif isinstance(message, Message):
-        for seg in message:
-            if seg.type == 'text':
-                seg.data['text'] = gfw.filter(seg.data.get('text', ''))
+        segs = [seg for seg in message if seg.type == 'text']
+        for seg, text in zip(segs, gfw.filter_many([seg.data.get('text', '') for seg in segs])):
+            seg.data['text'] = text
         return message
     else:
         raise TypeError
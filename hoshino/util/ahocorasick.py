@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+
+class Automaton:
+    """Aho-Corasick 多模式串匹配自动机
+
+    先 `add` 全部模式串, 再 `build` 一次; 之后对任意文本仅需一次线性扫描即可找出所有命中.
+
+    >>> ac = Automaton()
+    >>> ac.add('he', 1)
+    >>> ac.add('she', 2)
+    >>> ac.build()
+    >>> sorted(ac.findall('ushers'))
+    [1, 2]
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Any, ...]] = [()]
+        self._built = True
+
+    def add(self, word: str, value: Any):
+        if not word:
+            raise ValueError('Automaton does not accept empty pattern')
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += (value, )
+        self._built = False
+
+    def build(self):
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        for node in queue:
+            fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                out[child] += out[fail[child]]  # 合并后缀上的命中, 扫描时无需再沿失配链回溯
+                queue.append(child)
+        self._built = True
+
+    def iter(self, text: str) -> Iterator[Tuple[int, Any]]:
+        """逐个产出 `(end, value)`, `end` 为命中子串末字符的下标"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for value in out[node]:
+                yield i, value
+
+    def findall(self, text: str) -> Set[Any]:
+        """返回文本中出现过的全部模式串对应的 value"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
@@ -0,0 +1,65 @@
+"""繁体转简体的预编译实现, 输出与 `zhconv.convert(s, 'zh-hans')` 逐字节一致
+
+zhconv 对每个位置都以纯 Python 做最大正向匹配, 是消息分发中最慢的一步.
+这里将 zhconv 的 zh-hans 词表在导入时拆分为:
+
+- 单字转换表, 交给 `str.translate` 在 C 层批量完成
+- 词组表, 按首字索引, 每个首字下按长度从长到短排列, 仅在词组首字处查询
+- 纯 ASCII 文本直接返回; 不含任何词组首字的文本只需一次 `str.translate`
+"""
+
+import re
+from typing import Dict
+
+from zhconv import zhconv as _zhconv
+
+
+def _build():
+    table = _zhconv.getdict('zh-hans')
+    chars = {}
+    phrases = {}
+    for k, v in table.items():
+        if len(k) == 1:
+            if k != v:
+                chars[ord(k)] = v
+        else:
+            phrases.setdefault(k[0], {}).setdefault(len(k), {})[k] = v
+    phrases = {
+        head: tuple(sorted(by_len.items(), reverse=True))
+        for head, by_len in phrases.items()
+    }
+    return chars, phrases
+
+
+_CHAR_TABLE, _PHRASES = _build()
+_PHRASE_HEADS = frozenset(_PHRASES)
+_re_phrase_head = re.compile('[%s]' % ''.join(map(re.escape, sorted(_PHRASE_HEADS))))
+ASCII_SAFE = not any(chr(c).isascii() for c in _CHAR_TABLE) and not any(h.isascii() for h in _PHRASE_HEADS)
+
+
+def char_table() -> Dict[int, str]:
+    """单字繁转简表, 可直接用于 `str.translate`"""
+    return _CHAR_TABLE
+
+
+def to_hans(s: str) -> str:
+    if ASCII_SAFE and s.isascii():
+        return s
+    if _PHRASE_HEADS.isdisjoint(s):
+        return s.translate(_CHAR_TABLE)
+    out = []
+    pos = 0
+    for m in _re_phrase_head.finditer(s):
+        i = m.start()
+        if i < pos:
+            continue
+        for length, words in _PHRASES[s[i]]:
+            word = words.get(s[i:i + length])
+            if word is not None:
+                if i > pos:
+                    out.append(s[pos:i].translate(_CHAR_TABLE))
+                out.append(word)
+                pos = i + length
+                break
+    out.append(s[pos:].translate(_CHAR_TABLE))
+    return ''.join(out)
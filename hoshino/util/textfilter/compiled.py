@@ -0,0 +1,201 @@
+"""预编译的敏感词过滤器
+
+`DFAFilter`每次启动都要把上万行词表建成嵌套 dict, 既慢又占内存.
+这里把词表编译为按层序编号的扁平数组, 写入二进制文件, 之后的启动直接以 mmap 映射,
+多个进程可共享同一份只读页面. 缓存文件以词表内容的哈希命名, 词表改动后自动重新编译.
+
+编译结果是带失配链接的 Aho-Corasick 自动机, 过滤时只需扫描一遍文本.
+
+文件格式 (整数均为本机字节序的 uint32):
+    header: magic, version, 字节序标记, n_nodes, n_edges
+    starts[n_nodes + 1]  节点 i 的出边为 [starts[i], starts[i+1])
+    labels[n_edges]      出边字符的码位, 每个节点内升序
+    targets[n_edges]     出边指向的节点
+    fail[n_nodes]        失配链接
+    out[n_nodes]         沿失配链接可达的最近的词尾节点, 0 表示没有
+    depth[n_nodes]       节点深度, 即词尾节点对应的词长
+    term[n_nodes]        uint8, 节点是否为某个词的结尾
+"""
+
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+from hoshino.typing import Dict, Iterable, List
+
+MAGIC = b'HSGF'
+VERSION = 2
+_BOM = 0x01020304
+_HEADER = struct.Struct('=4sIIII')
+
+
+def compile_words(words: Iterable[str]) -> bytes:
+    root = {}
+    for word in words:
+        word = word.strip()
+        if not word:
+            continue
+        node = root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[None] = True     # 词尾标记
+
+    starts = array('I')
+    labels = array('I')
+    targets = array('I')
+    fail = array('I', [0])
+    out = array('I', [0])
+    depth = array('I', [0])
+    term = bytearray()
+    queue = [root]
+    children: List[Dict[str, int]] = []     # 按编号的出边, 计算失配链接用
+    for u, node in enumerate(queue):
+        starts.append(len(labels))
+        term.append(1 if None in node else 0)
+        edges = {}
+        for ch in sorted(k for k in node if k is not None):
+            v = len(queue)
+            labels.append(ord(ch))
+            targets.append(v)
+            queue.append(node[ch])
+            edges[ch] = v
+            # 层序遍历保证 u 及其失配链上的节点都已处理
+            f = fail[u]
+            while f and ch not in children[f]:
+                f = fail[f]
+            f = children[f].get(ch, 0) if u else 0
+            fail.append(f)
+            out.append(f if queue[f].get(None) else out[f])
+            depth.append(depth[u] + 1)
+        children.append(edges)
+    starts.append(len(labels))
+    header = _HEADER.pack(MAGIC, VERSION, _BOM, len(queue), len(labels))
+    return b''.join((header, starts.tobytes(), labels.tobytes(), targets.tobytes(),
+                     fail.tobytes(), out.tobytes(), depth.tobytes(), bytes(term)))
+
+
+class CompiledFilter:
+    """与`DFAFilter`输出一致的敏感词过滤器, 数据直接取自编译结果(可为 mmap)
+
+    `DFAFilter`在每个位置重新从根走 trie 并切片复制余下文本, 长文本上是平方复杂度;
+    这里沿失配链接单遍扫描, 记录每个起点的最短命中, 再自左向右贪心替换, 输出与之逐字一致.
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+        view = memoryview(buf)
+        if len(view) < _HEADER.size:
+            raise ValueError('truncated compiled filter')
+        magic, version, bom, n_nodes, n_edges = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION or bom != _BOM:
+            raise ValueError('incompatible compiled filter')
+        if len(view) != _HEADER.size + 4 * (n_nodes + 1 + 2 * n_edges + 3 * n_nodes) + n_nodes:
+            raise ValueError('truncated compiled filter')
+        pos = _HEADER.size
+        self._starts = view[pos:pos + 4 * (n_nodes + 1)].cast('I')
+        pos += 4 * (n_nodes + 1)
+        self._labels = view[pos:pos + 4 * n_edges].cast('I')
+        pos += 4 * n_edges
+        self._targets = view[pos:pos + 4 * n_edges].cast('I')
+        pos += 4 * n_edges
+        self._fail = view[pos:pos + 4 * n_nodes].cast('I')
+        pos += 4 * n_nodes
+        self._out = view[pos:pos + 4 * n_nodes].cast('I')
+        pos += 4 * n_nodes
+        self._depth = view[pos:pos + 4 * n_nodes].cast('I')
+        pos += 4 * n_nodes
+        self._term = view[pos:pos + n_nodes]
+        # 根节点出边最多, 单独建 dict; 其余节点在 labels 区间内二分查找
+        self._root = {chr(self._labels[i]): self._targets[i] for i in range(self._starts[0], self._starts[1])}
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledFilter":
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buf)
+
+    @classmethod
+    def from_wordfile(cls, path: str, cache_dir: str) -> "CompiledFilter":
+        """从缓存加载`path`词表的编译结果, 缓存不存在或已失效时重新编译并写入缓存"""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()[:16]
+        prefix = f'{os.path.splitext(os.path.basename(path))[0]}-v'
+        cache_file = os.path.join(cache_dir, f'{prefix}{VERSION}-{digest}.bin')
+        try:
+            return cls.load(cache_file)
+        except (OSError, ValueError):
+            pass
+        data = compile_words(raw.decode('utf8').splitlines())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{cache_file}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, cache_file)
+            for name in os.listdir(cache_dir):  # 清理旧词表或旧格式的缓存
+                if name.startswith(prefix) and name.endswith('.bin') and name != os.path.basename(cache_file):
+                    os.remove(os.path.join(cache_dir, name))
+            return cls.load(cache_file)
+        except OSError:
+            return cls(data)    # 缓存目录不可写时直接使用内存中的结果
+
+    def _shortest_hits(self, text: str) -> Dict[int, int]:
+        """单遍扫描`text`, @return: {起点: 以该起点开始的最短敏感词的终点}"""
+        root, starts, labels, targets = self._root, self._starts, self._labels, self._targets
+        fail, out, depth, term = self._fail, self._out, self._depth, self._term
+        bisect_left = bisect.bisect_left
+        hits = {}
+        node = 0
+        for i, ch in enumerate(text):
+            if not node:
+                node = root.get(ch, 0)
+                if not node:
+                    continue
+            else:
+                c = ord(ch)
+                while True:
+                    lo, hi = starts[node], starts[node + 1]
+                    j = bisect_left(labels, c, lo, hi)
+                    if j < hi and labels[j] == c:
+                        node = targets[j]
+                        break
+                    node = fail[node]
+                    if not node:
+                        node = root.get(ch, 0)
+                        break
+                if not node:
+                    continue
+            # 终点递增, 每个起点第一次被记录时即为最短的词
+            end = i + 1
+            k = node if term[node] else out[node]
+            while k:
+                start = end - depth[k]
+                if start not in hits:
+                    hits[start] = end
+                k = out[k]
+        return hits
+
+    def filter(self, message: str, repl: str = "*") -> str:
+        """自左向右, 将每个位置起最短的敏感词替换为等长的`repl`, 被替换的部分不再参与匹配"""
+        hits = self._shortest_hits(message)
+        if not hits:
+            return message
+        ret: List[str] = []
+        pos = 0
+        for start in sorted(hits):
+            if start < pos:
+                continue
+            end = hits[start]
+            ret.append(message[pos:start])
+            ret.append(repl * (end - start))
+            pos = end
+        ret.append(message[pos:])
+        return ''.join(ret)
+
+    def filter_many(self, texts: Iterable[str], repl: str = "*") -> List[str]:
+        """逐个过滤`texts`, 结果按原顺序返回"""
+        return [self.filter(t, repl) if t else t for t in texts]
@@ -0,0 +1,146 @@
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Item(NamedTuple):
+    key: str
+    value: Any
+
+
+class FrozenTrie:
+    """只读的紧凑前缀树, 构建一次后不再修改
+
+    节点按广度优先编号, 全部存放在几个扁平数组中:
+    节点`i`的出边字符为`labels[starts[i]:starts[i+1]]`, 对应的子节点为`targets`的同一区间,
+    `vidx[i]`为该节点在`values`中的下标(-1表示不是键的结尾).
+
+    传入`fold`(单字到单字的`str.translate`表)时, 键与查询文本都会先经过折叠,
+    例如用繁转简表折叠, 同一份索引即可同时匹配简体与繁体, 而无需把每个前缀存两遍.
+    折叠后重复的键由`merge(old, new)`合并, 未提供`merge`时后者覆盖前者.
+
+    >>> t = FrozenTrie({'ab': 1, 'abc': 2})
+    >>> t.longest_prefix('abcd')
+    Item(key='abc', value=2)
+    """
+
+    def __init__(self, items: Iterable[Tuple[str, Any]] = (), fold: Dict[int, str] = None,
+                 merge: Callable[[Any, Any], Any] = None):
+        if isinstance(items, dict):
+            items = items.items()
+        self._fold = {k: v for k, v in fold.items() if len(v) == 1} if fold else None
+        folded: Dict[str, Any] = {}
+        for key, value in items:
+            key = self._fold_text(key)
+            if merge and key in folded:
+                value = merge(folded[key], value)
+            folded[key] = value
+
+        # 先建立临时的嵌套 dict, 再按层序展开为数组
+        root = {}
+        for key in folded:
+            node = root
+            for ch in key:
+                node = node.setdefault(ch, {})
+        labels: List[str] = []
+        starts = array('i')
+        targets = array('i')
+        vidx = array('i')
+        values = []
+        queue = [(root, '')]
+        for node, prefix in queue:
+            starts.append(len(labels))
+            if prefix in folded:
+                vidx.append(len(values))
+                values.append(folded[prefix])
+            else:
+                vidx.append(-1)
+            for ch in sorted(node):
+                labels.append(ch)
+                targets.append(len(queue))
+                queue.append((node[ch], prefix + ch))
+        starts.append(len(labels))
+
+        self._labels = ''.join(labels)
+        self._starts = starts
+        self._targets = targets
+        self._vidx = vidx
+        self._values = values
+        self._keys = list(folded)
+        self._depth = max(map(len, folded), default=0)
+        # 根节点的出边最多, 单独用 dict 索引; 其余节点出边很少, 在 labels 区间内查找即可
+        self._root = {labels[i]: targets[i] for i in range(starts[0], starts[1])}
+
+    def _fold_text(self, text: str) -> str:
+        return text.translate(self._fold) if self._fold else text
+
+    def _walk(self, key: str) -> int:
+        labels, starts, targets = self._labels, self._starts, self._targets
+        if not key:
+            return 0
+        node = self._root.get(key[0], -1)
+        for ch in key[1:]:
+            if node < 0:
+                break
+            i = labels.find(ch, starts[node], starts[node + 1])
+            node = targets[i] if i >= 0 else -1
+        return node
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key: str) -> bool:
+        node = self._walk(self._fold_text(key))
+        return node >= 0 and self._vidx[node] >= 0
+
+    def __getitem__(self, key: str):
+        node = self._walk(self._fold_text(key))
+        if node < 0 or self._vidx[node] < 0:
+            raise KeyError(key)
+        return self._values[self._vidx[node]]
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        """折叠后的全部键"""
+        return list(self._keys)
+
+    def longest_prefix(self, text: str) -> Optional[Item]:
+        """@return: 以`text`的最长前缀为键的`Item`, `key`为`text`中的原文; 无匹配时返回`None`"""
+        labels, starts, targets, vidx = self._labels, self._starts, self._targets, self._vidx
+        best, best_len = vidx[0], 0
+        folded = self._fold_text(text[:self._depth])
+        node = self._root.get(folded[:1], -1)
+        n = 1
+        while node >= 0:
+            if vidx[node] >= 0:
+                best, best_len = vidx[node], n
+            if n == len(folded):
+                break
+            i = labels.find(folded[n], starts[node], starts[node + 1])
+            node = targets[i] if i >= 0 else -1
+            n += 1
+        if best < 0:
+            return None
+        return Item(text[:best_len], self._values[best])
+
+    def prefixes(self, text: str) -> List[Item]:
+        """@return: 以`text`的各个前缀为键的`Item`, 由长到短排列"""
+        labels, starts, targets, vidx = self._labels, self._starts, self._targets, self._vidx
+        found = [Item('', self._values[vidx[0]])] if vidx[0] >= 0 else []
+        folded = self._fold_text(text[:self._depth])
+        node = self._root.get(folded[:1], -1)
+        n = 1
+        while node >= 0:
+            if vidx[node] >= 0:
+                found.append(Item(text[:n], self._values[vidx[node]]))
+            if n == len(folded):
+                break
+            i = labels.find(folded[n], starts[node], starts[node + 1])
+            node = targets[i] if i >= 0 else -1
+            n += 1
+        found.reverse()
+        return found
@@ -0,0 +1,34 @@
+"""测试环境
+
+不依赖部署用的`hoshino/config`: 以`config_example/__bot__.py`的默认值构造`hoshino.config`, 不加载任何模块.
+`~/.hoshino`与`log/`都建在临时目录中, 不会写入工作目录或用户目录.
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_tmp = tempfile.mkdtemp(prefix='hoshino-test-')
+os.environ['HOME'] = _tmp
+sys.path.insert(0, _root)
+
+config = types.ModuleType('hoshino.config')
+exec('from nonebot.default_config import *', config.__dict__)
+with open(os.path.join(_root, 'hoshino', 'config_example', '__bot__.py'), encoding='utf8') as f:
+    exec(f.read(), config.__dict__)
+config.MODULES_ON = set()
+sys.modules['hoshino.config'] = config
+
+_cwd = os.getcwd()
+os.chdir(_tmp)  # hoshino.log 在当前目录下建立 log/
+import hoshino  # noqa: E402
+os.chdir(_cwd)
+
+
+@pytest.fixture(scope='session')
+def bot():
+    return hoshino.init()
@@ -0,0 +1,61 @@
+import pytest
+from aiocqhttp.exceptions import ActionFailed
+
+import hoshino
+from hoshino.accounts import AccountRouter
+
+
+def _fail(router, self_id, times=1):
+    for _ in range(times):
+        with pytest.raises(ActionFailed):
+            with router.track(self_id):
+                raise ActionFailed({'retcode': 100})
+
+
+def test_rank_by_load():
+    r = AccountRouter()
+    for _ in range(3):
+        with r.track(1):
+            pass
+    with r.track(2):
+        pass
+    assert r.rank([1, 2, 3]) == [3, 2, 1]
+    assert r.pick([1, 2]) == 2
+
+
+def test_cooldown_after_consecutive_failures():
+    r = AccountRouter(failure_threshold=2, cooldown=60)
+    _fail(r, 1)
+    assert r.healthy(1)
+    _fail(r, 1)
+    assert not r.healthy(1)
+    assert r.rank([1, 2]) == [2, 1]     # 暂停使用的排在最后, 但仍可作为最后的选择
+    assert r.rank([1]) == [1]
+    with r.track(1):
+        pass
+    assert r.healthy(1)
+
+
+def test_rank_does_not_depend_on_connection_mode():
+    r = AccountRouter()
+    assert sorted(r.rank([5, 6])) == [5, 6]
+    assert r.healthy(5)
+
+
+def test_str_and_int_self_id_share_stats():
+    r = AccountRouter(failure_threshold=2, cooldown=60)
+    _fail(r, 10001, 2)              # 回复以事件中 int 的 self_id 记录
+    assert not r.healthy('10001')   # 广播以`_wsr_api_clients`中 str 的键挑选
+    assert r.rank(['10002', '10001']) == [10002, 10001]
+    with r.track('10002'):
+        pass
+    assert set(r._stats) == {10001, 10002}
+    healthy = [line for line in r.collect() if line.startswith('hoshino_account_healthy{')]
+    assert sorted(healthy) == ['hoshino_account_healthy{self_id="10001"} 0', 'hoshino_account_healthy{self_id="10002"} 1']
+
+
+def test_get_self_ids_uses_connected_accounts(bot, monkeypatch):
+    monkeypatch.setattr(bot, '_wsr_api_clients', {})
+    assert list(hoshino.get_self_ids()) == []
+    monkeypatch.setattr(bot, '_wsr_api_clients', {'1': None, '2': None})   # aiocqhttp 以 X-Self-ID 为键
+    assert sorted(hoshino.get_self_ids()) == [1, 2]
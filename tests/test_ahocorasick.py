@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from hoshino.util.ahocorasick import Automaton
+
+
+def _naive(words, text):
+    return {i for i, w in enumerate(words) if w in text}
+
+
+def test_doc_example():
+    ac = Automaton()
+    ac.add('he', 1)
+    ac.add('she', 2)
+    ac.add('his', 3)
+    ac.add('hers', 4)
+    assert ac.findall('ushers') == {1, 2, 4}
+    assert sorted(ac.iter('ushers')) == [(3, 1), (3, 2), (5, 4)]
+
+
+def test_empty_pattern_rejected():
+    with pytest.raises(ValueError):
+        Automaton().add('', 0)
+
+
+def test_same_word_multiple_values():
+    ac = Automaton()
+    ac.add('会战', 'a')
+    ac.add('会战', 'b')
+    assert ac.findall('今天会战') == {'a', 'b'}
+
+
+def test_add_after_build_rebuilds():
+    ac = Automaton()
+    ac.add('ab', 0)
+    assert ac.findall('xab') == {0}
+    ac.add('b', 1)
+    assert ac.findall('xab') == {0, 1}
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_naive_search(seed):
+    rnd = random.Random(seed)
+    alphabet = 'abc会战出刀'
+    words = list({''.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 4))) for _ in range(30)})
+    ac = Automaton()
+    for i, w in enumerate(words):
+        ac.add(w, i)
+    ac.build()
+    for _ in range(50):
+        text = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 30)))
+        assert ac.findall(text) == _naive(words, text)
+        hits = sorted(ac.iter(text))
+        expected = sorted(
+            (start + len(w) - 1, i)
+            for i, w in enumerate(words)
+            for start in range(len(text))
+            if text.startswith(w, start)
+        )
+        assert hits == expected
@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from hoshino.executor import BEST_EFFORT, CRITICAL, NORMAL, DispatchExecutor
+
+
+def _recorder(log, running=None, delay=0.0):
+    def job(key):
+        async def run():
+            if running is not None:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            if delay:
+                await asyncio.sleep(delay)
+            log.append(key)
+            if running is not None:
+                running[0] -= 1
+        return run
+    return job
+
+
+async def _drain(ex: DispatchExecutor):
+    while ex._queues or ex._workers:
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.parametrize('overflow', ['drop_oldest', 'drop_new', 'block'])
+def test_per_group_fifo_and_concurrency(overflow):
+    async def main():
+        ex = DispatchExecutor(concurrency=2, queue_size=3, overflow=overflow)
+        log, running = [], [0, 0]
+        job = _recorder(log, running, delay=0.002)
+        for i in range(6):
+            for g in (1, 2, 3):
+                await ex.submit(g, job((g, i)))
+        await _drain(ex)
+        for g in (1, 2, 3):
+            seq = [i for gg, i in log if gg == g]
+            assert seq == sorted(seq)
+        assert running[1] <= 2
+        if overflow == 'block':
+            assert len(log) == 18
+        return ex
+    ex = asyncio.run(main())
+    assert ex.depth == 0 and ex.running == 0
+
+
+def test_drop_policies():
+    async def main(overflow):
+        ex = DispatchExecutor(concurrency=1, queue_size=2, overflow=overflow)
+        log, dropped = [], []
+        job = _recorder(log)
+        for i in range(4):
+            await ex.submit(1, job(i), lambda reason, i=i: dropped.append((i, reason)))
+        await _drain(ex)
+        return log, dropped
+    assert asyncio.run(main('drop_oldest')) == ([2, 3], [(0, 'overflow'), (1, 'overflow')])
+    assert asyncio.run(main('drop_new')) == ([0, 1], [(2, 'overflow'), (3, 'overflow')])
+
+
+def test_block_submit_after_worker_exit_keeps_single_worker():
+    # 阻塞中的 submit 被唤醒前 worker 已取空队列退出, 且另一个 submit 已建立了新的队列与 worker:
+    # 被唤醒的 submit 应排入新队列, 而不是再启动一个 worker
+    async def main():
+        ex = DispatchExecutor(concurrency=4, queue_size=1, overflow='block')
+        log, running = [], [0, 0]
+        gate = asyncio.get_event_loop().create_future()
+        async def first():
+            await gate
+            log.append('a')
+        slow = _recorder(log, running, delay=0.005)
+        await ex.submit(1, first)
+        await asyncio.sleep(0)                      # worker 开始执行 a
+        await ex.submit(1, _recorder(log)('x'))     # 队列已满
+        blocked = asyncio.ensure_future(ex.submit(1, slow('b')))
+        await asyncio.sleep(0)                      # b 等待空位
+        gate.set_result(None)
+        later = asyncio.ensure_future(ex.submit(1, slow('c')))
+        await asyncio.gather(blocked, later)
+        await _drain(ex)
+        return log, running[1], ex
+    log, peak, ex = asyncio.run(main())
+    assert log == ['a', 'x', 'c', 'b']
+    assert peak == 1
+    assert not ex._workers
+
+
+def test_handler_exception_does_not_stop_group():
+    async def main():
+        ex = DispatchExecutor(concurrency=1, queue_size=5)
+        log = []
+        async def boom():
+            raise RuntimeError('boom')
+        await ex.submit(1, boom)
+        await ex.submit(1, _recorder(log)('after'))
+        await _drain(ex)
+        return log, ex.completed
+    assert asyncio.run(main()) == (['after'], 2)
+
+
+def test_shed_by_priority_under_depth():
+    async def main():
+        ex = DispatchExecutor(concurrency=1, queue_size=50, shed_depth=5, shed_latency=100)
+        log, dropped = [], []
+        job = _recorder(log, delay=0.001)
+        for i in range(30):
+            for p in (CRITICAL, NORMAL, BEST_EFFORT):
+                await ex.submit(i % 3, job(p), lambda reason, p=p: dropped.append((p, reason)), priority=p, tag=p)
+        await _drain(ex)
+        return ex, log, dropped
+    ex, log, dropped = asyncio.run(main())
+    assert log.count(CRITICAL) == 30
+    assert CRITICAL not in {p for p, _ in dropped}
+    assert {reason for _, reason in dropped} == {'shed'}
+    assert ex.shed[(BEST_EFFORT, BEST_EFFORT)] >= ex.shed[(NORMAL, NORMAL)] > 0
+
+
+def test_load_levels():
+    ex = DispatchExecutor(shed_depth=10, shed_latency=1.0)
+    assert ex.load_level() == 0
+    ex.depth = 10
+    assert ex.load_level() == 1
+    assert ex.admit(NORMAL) and not ex.admit(BEST_EFFORT)
+    ex.depth = 20
+    assert ex.load_level() == 2
+    assert ex.admit(CRITICAL) and not ex.admit(NORMAL)
+    ex.depth, ex.waiting, ex.wait_avg = 0, 0, 5.0
+    assert ex.load_level() == 0     # 没有积压时不参考过时的平均值
+    ex.waiting = 1
+    assert ex.load_level() == 2
+
+
+def test_overflow_evicts_lower_priority_first():
+    async def main():
+        ex = DispatchExecutor(concurrency=1, queue_size=2, overflow='drop_new', shed_depth=1000)
+        gate = asyncio.get_event_loop().create_future()
+        async def hold():
+            await gate
+        await ex.submit(1, hold)
+        await asyncio.sleep(0)
+        dropped = []
+        for p in (BEST_EFFORT, NORMAL, CRITICAL, CRITICAL):
+            await ex.submit(1, _recorder([])(p), lambda reason, p=p: dropped.append(p), priority=p)
+        queued = [j.priority for j in ex._queues[1].jobs]
+        gate.set_result(None)
+        await _drain(ex)
+        return dropped, queued
+    assert asyncio.run(main()) == ([BEST_EFFORT, NORMAL], [CRITICAL, CRITICAL])
+
+
+def test_slow_group_does_not_raise_load():
+    # 同群排在慢任务之后的等待不计入负载, 其他群的 best_effort 照常受理
+    async def main():
+        ex = DispatchExecutor(concurrency=8, queue_size=50, shed_depth=1000, shed_latency=0.01)
+        job = _recorder([], delay=0.005)
+        for i in range(8):
+            await ex.submit(1, job(i))
+        await _drain(ex)
+        return ex
+    ex = asyncio.run(main())
+    assert ex.wait_avg < ex.shed_latency
+    assert ex.wait_time.count == 8
+
+
+def test_saturated_semaphore_raises_load():
+    async def main():
+        ex = DispatchExecutor(concurrency=1, queue_size=50, shed_depth=1000, shed_latency=0.005)
+        job = _recorder([], delay=0.01)
+        for g in range(6):
+            await ex.submit(g, job(g))
+        await asyncio.sleep(0.035)
+        level = ex.load_level()
+        await _drain(ex)
+        return level
+    assert asyncio.run(main()) >= 1
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from aiocqhttp import Event
+from aiocqhttp.exceptions import ActionFailed
+
+from hoshino import grouplist
+from hoshino.grouplist import GroupListCache
+
+
+class FakeApi:
+
+    def __init__(self, groups):
+        self.groups = groups    # {self_id: [group_id]}
+        self.calls = 0
+        self.fail = False
+
+    async def get_group_list(self, self_id):
+        self.calls += 1
+        await asyncio.sleep(0.001)
+        if self.fail:
+            raise ActionFailed({'retcode': 100})
+        return [{'group_id': g, 'group_name': f'g{g}'} for g in self.groups[self_id]]
+
+    async def get_group_info(self, self_id, group_id):
+        return {'group_id': group_id, 'group_name': f'new{group_id}'}
+
+
+@pytest.fixture
+def api(bot, monkeypatch):
+    api = FakeApi({1: [10, 11], 2: [11, 12]})
+    monkeypatch.setattr(bot, 'get_group_list', api.get_group_list, raising=False)
+    monkeypatch.setattr(bot, 'get_group_info', api.get_group_info, raising=False)
+    return api
+
+
+def test_ttl_and_single_flight(api):
+    async def main():
+        c = GroupListCache(ttl=0.02)
+        r = await asyncio.gather(*(c.get(1) for _ in range(5)))
+        assert all(x is r[0] for x in r) and sorted(r[0]) == [10, 11]
+        assert api.calls == 1
+        await c.get(1)
+        assert api.calls == 1
+        await asyncio.sleep(0.03)
+        await c.get(1)
+        assert api.calls == 2
+        await c.get(1, refresh=True)
+        assert api.calls == 3
+        return c
+    c = asyncio.run(main())
+    assert c.requests['coalesced'] == 4
+
+
+def test_failure_serves_stale_and_backs_off(api):
+    async def main():
+        c = GroupListCache(ttl=0.01, retry=0.05)
+        groups = await c.get(1)
+        api.fail = True
+        await asyncio.sleep(0.02)
+        for _ in range(10):
+            assert await c.get(1) is groups
+        assert api.calls == 2   # 失败后在 retry 期间不再请求
+        await asyncio.sleep(0.06)
+        await c.get(1)
+        assert api.calls == 3
+        with pytest.raises(ActionFailed):
+            await c.get(2)      # 没有旧缓存可用
+    asyncio.run(main())
+
+
+def test_notices_update_cached_list(api):
+    async def main():
+        c = GroupListCache()
+        await c.get(1)
+        def notice(kind, group_id, user_id=1):
+            return Event.from_payload({'post_type': 'notice', 'notice_type': kind, 'sub_type': '',
+                                       'self_id': 1, 'user_id': user_id, 'group_id': group_id})
+        await c.on_notice(notice('group_increase', 13))
+        assert 13 in await c.get(1)
+        await asyncio.sleep(0.01)   # 后台补全群信息
+        assert (await c.get(1))[13]['group_name'] == 'new13'
+        await c.on_notice(notice('group_decrease', 10))
+        await c.on_notice(notice('group_increase', 14, user_id=99))    # 别人入群, 与 bot 无关
+        assert sorted(await c.get(1)) == [11, 13]
+        assert api.calls == 1
+    asyncio.run(main())
+
+
+def test_get_groups(api, bot, monkeypatch):
+    monkeypatch.setattr(bot, '_wsr_api_clients', {'1': None, '2': None})    # aiocqhttp 以 X-Self-ID 为键
+    monkeypatch.setattr(grouplist, 'cache', GroupListCache())
+    groups = asyncio.run(grouplist.get_groups())
+    assert {g: sorted(sids) for g, sids in groups.items()} == {10: [1], 11: [1, 2], 12: [2]}
+    assert sorted(g['group_id'] for g in asyncio.run(grouplist.get_group_list('2'))) == [11, 12]
+    assert api.calls == 2
+
+
+def test_notice_reaches_groups_filled_by_str_self_id(api, bot, monkeypatch):
+    monkeypatch.setattr(bot, '_wsr_api_clients', {'1': None, '2': None})
+    monkeypatch.setattr(grouplist, 'cache', GroupListCache())
+    async def main():
+        await grouplist.get_groups()
+        await grouplist.cache.on_notice(Event.from_payload({
+            'post_type': 'notice', 'notice_type': 'group_decrease', 'sub_type': 'kick_me',
+            'self_id': 1, 'user_id': 1, 'group_id': 10, 'operator_id': 99}))
+        grouplist.cache.add(2, 13)  # 同意入群邀请时以 int 的 self_id 写入
+        return await grouplist.get_groups()
+    groups = asyncio.run(main())
+    assert {g: sorted(sids) for g, sids in groups.items()} == {11: [1, 2], 12: [2], 13: [2]}
+    assert api.calls == 2
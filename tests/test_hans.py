@@ -0,0 +1,43 @@
+import random
+
+import pytest
+import zhconv
+from zhconv import zhconv as _zhconv
+
+from hoshino.util import hans
+
+_TABLE = _zhconv.getdict('zh-hans')
+_CHARS = sorted(k for k in _TABLE if len(k) == 1)
+_PHRASES = sorted(k for k in _TABLE if len(k) > 1)
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'hello, world',
+    '公主連結會戰',
+    '乾隆皇帝',
+    '頭髮乾燥',
+    '於是他說',
+    '「測試」ＡＢＣ１２３',
+])
+def test_fixed_samples(text):
+    assert hans.to_hans(text) == zhconv.convert(text, 'zh-hans')
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_matches_zhconv(seed):
+    rnd = random.Random(seed)
+    pieces = (
+        lambda: rnd.choice(_CHARS),
+        lambda: rnd.choice(_PHRASES),
+        lambda: rnd.choice(_PHRASES)[:-1],  # 词组的前半截, 考验回退到单字
+        lambda: rnd.choice('abc 123,.!?'),
+        lambda: rnd.choice('的一是在不了有和人这中大为上个国我以要他'),
+    )
+    for _ in range(200):
+        text = ''.join(rnd.choice(pieces)() for _ in range(rnd.randint(1, 12)))
+        assert hans.to_hans(text) == zhconv.convert(text, 'zh-hans'), text
+
+
+def test_char_table():
+    assert '會戰'.translate(hans.char_table()) == '会战'
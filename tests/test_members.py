@@ -0,0 +1,150 @@
+import asyncio
+from time import monotonic
+
+import pytest
+from aiocqhttp import Event
+from aiocqhttp.exceptions import ActionFailed
+
+from hoshino.members import MemberCache
+
+
+class FakeApi:
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_group_member_info(self, self_id, group_id, user_id):
+        self.calls.append(('info', group_id, user_id))
+        await asyncio.sleep(0.001)
+        if user_id == 99:
+            raise ActionFailed({'retcode': 100})
+        return {'user_id': user_id, 'card': f'c{user_id}'}
+
+    async def get_group_member_list(self, self_id, group_id):
+        self.calls.append(('list', group_id))
+        await asyncio.sleep(0.001)
+        return [{'user_id': u, 'card': f'c{u}'} for u in range(1, 6)]
+
+
+@pytest.fixture
+def api(bot, monkeypatch):
+    api = FakeApi()
+    monkeypatch.setattr(bot, 'get_group_member_info', api.get_group_member_info, raising=False)
+    monkeypatch.setattr(bot, 'get_group_member_list', api.get_group_member_list, raising=False)
+    return api
+
+
+def _notice(kind, group_id, user_id, self_id=1):
+    return Event.from_payload({'post_type': 'notice', 'notice_type': kind, 'sub_type': '',
+                               'self_id': self_id, 'user_id': user_id, 'group_id': group_id})
+
+
+def test_get_many_and_hits(api):
+    async def main():
+        c = MemberCache()
+        r = await c.get_many(1, 100, [1, 2, 2, 99])
+        assert {k: v and v['card'] for k, v in r.items()} == {1: 'c1', 2: 'c2', 99: None}
+        assert sorted(api.calls) == [('info', 100, 1), ('info', 100, 2), ('info', 100, 99)]
+        api.calls.clear()
+        await c.get_many(1, 100, [1, 2])
+        assert api.calls == []
+    asyncio.run(main())
+
+
+def test_get_list_fills_group(api):
+    async def main():
+        c = MemberCache()
+        lists = await asyncio.gather(c.get_list(1, 200), c.get_list(1, 200))
+        assert api.calls == [('list', 200)]
+        assert len(lists[0]) == 5
+        assert sorted(m['user_id'] for m in await c.get_list(1, 200)) == [1, 2, 3, 4, 5]
+        assert (await c.get(1, 200, 3))['card'] == 'c3'
+        assert api.calls == [('list', 200)]
+    asyncio.run(main())
+
+
+def test_notice_invalidates_but_peek_keeps(api):
+    async def main():
+        c = MemberCache()
+        await c.get_list(1, 200)
+        await c.on_notice(_notice('group_decrease', 200, 3))
+        assert c.peek(1, 200, 3)['card'] == 'c3'
+        api.calls.clear()
+        await c.get(1, 200, 3)
+        await c.get_list(1, 200)
+        assert api.calls == [('info', 200, 3), ('list', 200)]
+        await c.on_notice(_notice('group_decrease', 200, 1, self_id=1))  # bot 自己退群
+        assert c.peek(1, 200, 2) is None
+    asyncio.run(main())
+
+
+def test_ttl(api):
+    async def main():
+        c = MemberCache(ttl=0.01)
+        await c.get(1, 100, 1)
+        await asyncio.sleep(0.02)
+        await c.get(1, 100, 1)
+        assert api.calls == [('info', 100, 1)] * 2
+    asyncio.run(main())
+
+
+def test_eviction_is_batched_lru():
+    c = MemberCache(ttl=100, max_size=100)
+    expire = monotonic() + 100
+    for u in range(100):
+        c._put(1, 1, {'user_id': u}, expire)
+    asyncio.run(c.get(1, 1, 0))     # 命中, 变为最近使用
+    c._put(1, 1, {'user_id': 100}, expire)
+    assert len(c._members) == 90    # 一次清理到上限的九成
+    assert c.peek(1, 1, 0) is not None
+    assert c.peek(1, 1, 1) is None
+    assert set(c._groups[(1, 1)]) == {u for (_, _, u) in c._members}
+
+
+def test_eviction_prefers_expired():
+    c = MemberCache(ttl=100, max_size=10)
+    for u in range(5):
+        c._put(1, 1, {'user_id': u}, 0.0)
+    for u in range(5, 11):
+        c._put(1, 2, {'user_id': u}, monotonic() + 100)
+    assert (1, 1) not in c._groups
+    assert sorted(c._groups[(1, 2)]) == list(range(5, 11))
+
+
+def test_eviction_drops_group_fill_record(api):
+    async def main():
+        c = MemberCache(max_size=6)
+        await c.get_list(1, 200)
+        assert (1, 200) in c._lists
+        await c.get(1, 300, 1)
+        await c.get(1, 300, 2)      # 超出上限, 淘汰 200 群最早的成员
+        assert (1, 200) not in c._lists
+        api.calls.clear()
+        await c.get_list(1, 200)
+        assert api.calls == [('list', 200)]
+    asyncio.run(main())
+
+
+def test_invalidate_group_uses_index():
+    c = MemberCache()
+    for g in (1, 2):
+        for u in range(3):
+            c._put(1, g, {'user_id': u}, monotonic() + 100)
+    c.invalidate(1, 1)
+    assert (1, 1) not in c._groups
+    assert sorted(k for k in c._members) == [(1, 2, 0), (1, 2, 1), (1, 2, 2)]
+
+
+def test_str_self_id_shares_int_entries(api):
+    async def main():
+        c = MemberCache()
+        await c.get_list('1', 300)  # billing 以`_wsr_api_clients`中 str 的键填充
+        await c.get_list(1, 300)
+        assert api.calls == [('list', 300)]
+        assert c.peek(1, 300, 2)['card'] == 'c2'
+        await c.on_notice(_notice('group_decrease', 300, 1))   # bot 自己退群, 通知中是 int
+        assert c.peek('1', 300, 2) is None
+        await c.get_list('1', 300)
+        assert api.calls == [('list', 300), ('list', 300)]
+        assert {k[0] for k in c._members} == {1}
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from hoshino import Service, multiplexer, priv
+from hoshino.executor import BEST_EFFORT, executor
+from hoshino.typing import CQEvent, Message
+
+
+def _event(group_id, text, user_id=5):
+    return CQEvent({
+        'post_type': 'message', 'message_type': 'group', 'sub_type': 'normal',
+        'self_id': 1, 'group_id': group_id, 'user_id': user_id, 'message_id': 1,
+        'message': Message(text), 'raw_message': text,
+        'sender': {'user_id': user_id, 'role': 'member'}, 'to_me': False,
+    })
+
+
+@pytest.fixture(scope='module')
+def services(bot):
+    calls = []
+    checked = []
+    active = set()
+
+    def when(ev):
+        checked.append(ev.group_id)
+        return ev.group_id in active
+
+    sv = Service('t-mux')
+    sv_off = Service('t-mux-off', enable_on_default=False)
+    sv_su = Service('t-mux-su', use_priv=priv.SUPERUSER)
+    sv_be = Service('t-mux-be', priority=BEST_EFFORT)
+
+    @sv.on_message(startswith=('!', '！'))
+    async def bang(bot, ev):
+        calls.append(('bang', ev.group_id))
+
+    @sv.on_message(when=when)
+    async def playing(bot, ev):
+        calls.append(('playing', ev.group_id))
+
+    @sv_off.on_message(probability=0.5)
+    async def sampled(bot, ev):
+        calls.append(('sampled', ev.group_id))
+
+    @sv_su.on_message(when=when)
+    async def su_only(bot, ev):
+        calls.append(('su_only', ev.group_id))
+
+    @sv_be.on_message(when=when)
+    async def best_effort(bot, ev):
+        calls.append(('best_effort', ev.group_id))
+
+    @sv.on_message()
+    async def boom(bot, ev):
+        raise ValueError('handler errors are logged, not raised')
+
+    return {'calls': calls, 'checked': checked, 'active': active, 'sv_off': sv_off, 'sv_be': sv_be}
+
+
+def _dispatch(ev):
+    asyncio.run(multiplexer.get('group').dispatch(ev))
+
+
+def test_prefilters(services):
+    calls, active = services['calls'], services['active']
+    calls.clear()
+    _dispatch(_event(1, '  ！出刀 100'))
+    _dispatch(_event(1, 'hi'))
+    active.add(2)
+    _dispatch(_event(2, 'hi'))
+    assert sorted(calls) == [('bang', 1), ('best_effort', 2), ('playing', 2)]
+
+
+def test_disabled_service_and_probability(services):
+    calls, sv_off = services['calls'], services['sv_off']
+    calls.clear()
+    _dispatch(_event(3, 'x'))
+    assert ('sampled', 3) not in calls
+    sv_off.set_enable(3)
+    try:
+        for _ in range(400):
+            _dispatch(_event(3, 'x'))
+        n = sum(1 for c in calls if c == ('sampled', 3))
+        assert 120 < n < 280
+    finally:
+        sv_off.set_disable(3)
+    calls.clear()
+    _dispatch(_event(3, 'x'))
+    assert ('sampled', 3) not in calls
+
+
+def test_predicate_runs_after_permission_and_admission(services, monkeypatch):
+    calls, checked, active = services['calls'], services['checked'], services['active']
+    active.add(4)
+    calls.clear()
+    checked.clear()
+    _dispatch(_event(4, 'hi'))
+    # 普通用户: 需要 SUPERUSER 的 su_only 不检查 when; playing 与 best_effort 各检查一次
+    assert checked == [4, 4]
+    assert ('su_only', 4) not in calls
+
+    calls.clear()
+    checked.clear()
+    monkeypatch.setattr(executor, 'depth', executor.shed_depth)     # 负载等级 1, 只舍弃 best_effort
+    shed = executor.shed[('t-mux-be', BEST_EFFORT)]
+    _dispatch(_event(4, 'hi'))
+    assert checked == [4]
+    assert ('best_effort', 4) not in calls and ('playing', 4) in calls
+    assert executor.shed[('t-mux-be', BEST_EFFORT)] == shed + 1
+
+
+def test_enabled_funcs_cache_follows_service_switch(services):
+    mux = multiplexer.get('group')
+    sv_off = services['sv_off']
+    names = lambda: [f.__name__ for f in mux.enabled_funcs(5)]
+    assert 'sampled' not in names()
+    sv_off.set_enable(5)
+    assert 'sampled' in names()
+    sv_off.set_disable(5)
+    assert 'sampled' not in names()
@@ -0,0 +1,182 @@
+import asyncio
+from time import monotonic
+
+import pytest
+from aiocqhttp import Event
+from aiocqhttp.exceptions import ActionFailed
+
+import hoshino
+from hoshino import broadcast, outbound
+from hoshino.accounts import AccountRouter
+from hoshino.outbound import OutboundPipeline
+from hoshino.typing import Message, MessageSegment
+
+
+class FakeBot:
+
+    def __init__(self):
+        self.calls = []
+
+    async def call_action(self, action, **params):
+        await asyncio.sleep(0.001)
+        if 'boom' in str(params.get('message')):
+            raise ActionFailed({'retcode': 100})
+        self.calls.append((action, params))
+        return {'message_id': len(self.calls)}
+
+
+def _pipeline(**kwargs):
+    kwargs.setdefault('group_rate', 1000)
+    kwargs.setdefault('group_burst', 1000)
+    kwargs.setdefault('coalesce_window', 0.01)
+    p = OutboundPipeline(**kwargs)
+    p._bot = FakeBot()
+    return p
+
+
+def _sent(p):
+    return [str(params['message']) for _, params in p._bot.calls]
+
+
+def test_queued_short_texts_are_coalesced():
+    async def main():
+        p = _pipeline()
+        return p, await asyncio.gather(*(p.send_group_msg(group_id=1, message=f'm{i}') for i in range(4)))
+    p, results = asyncio.run(main())
+    assert _sent(p) == ['m0\nm1\nm2\nm3']
+    assert results == [{'message_id': 1}] * 4   # 合并发送的各条共享返回值
+    assert p.sent == 1 and p.coalesced == 3
+
+
+@pytest.mark.parametrize('message', [
+    '[CQ:face,id=1]',
+    'hi[CQ:at,qq=1]',
+    MessageSegment.image('file:///dev/null'),
+    Message('x') + MessageSegment.at(1),
+])
+def test_non_text_messages_are_not_coalesced(message):
+    async def main():
+        p = _pipeline()
+        await asyncio.gather(p.send_group_msg(group_id=1, message='a'),
+                             p.send_group_msg(group_id=1, message=message),
+                             p.send_group_msg(group_id=1, message='b'))
+        return p
+    p = asyncio.run(main())
+    assert len(p._bot.calls) == 3
+    assert p._bot.calls[1][1]['message'] is message
+
+
+def test_merged_text_keeps_escapes():
+    async def main():
+        p = _pipeline()
+        await asyncio.gather(p.send_group_msg(group_id=1, message='a&amp;b'),
+                             p.send_group_msg(group_id=1, message=MessageSegment.text('[CQ:x]')))
+        return p
+    p = asyncio.run(main())
+    assert _sent(p) == ['a&amp;b\n&#91;CQ:x&#93;']
+    merged = p._bot.calls[0][1]['message']
+    assert [seg.type for seg in merged] == ['text']
+    assert merged[0].data['text'] == 'a&b\n[CQ:x]'
+
+
+def test_coalesce_limits():
+    async def main():
+        p = _pipeline(coalesce_max_len=5)
+        await asyncio.gather(
+            p.send_group_msg(group_id=1, message='aa'),
+            p.send_group_msg(group_id=1, message='bb'),     # 'aa\nbb' 为 5 字, 可合并
+            p.send_group_msg(group_id=1, message='cc'),
+            p.send_group_msg(group_id=1, message='dd', self_id=2),
+            p.send_group_msg(group_id=1, message='ee', self_id=2, auto_escape=True),
+            p.send_group_msg(group_id=1, message='ff', self_id=2, coalesce=False),
+            p.send_group_msg(group_id=1, message='toolong'),
+        )
+        return p
+    p = asyncio.run(main())
+    assert _sent(p) == ['aa\nbb', 'cc', 'dd', 'ee', 'ff', 'toolong']
+
+
+def test_failure_fans_out_to_batch():
+    async def main():
+        p = _pipeline()
+        results = await asyncio.gather(
+            p.send_group_msg(group_id=1, message='a'),
+            p.send_group_msg(group_id=1, message='boom'),
+            p.send_group_msg(group_id=1, message='c'),
+            return_exceptions=True,
+        )
+        after = await p.send_group_msg(group_id=1, message='d')
+        return p, results, after
+    p, results, after = asyncio.run(main())
+    assert all(isinstance(r, ActionFailed) for r in results)
+    assert p.errors == 1
+    assert after == {'message_id': 1} and _sent(p) == ['d']
+
+
+def test_group_order_and_pacing():
+    async def main():
+        p = _pipeline(group_rate=100, group_burst=1)
+        start = monotonic()
+        await asyncio.gather(*(p.send_group_msg(group_id=1, message=str(i), coalesce=False) for i in range(4)))
+        return p, monotonic() - start
+    p, elapsed = asyncio.run(main())
+    assert _sent(p) == ['0', '1', '2', '3']
+    assert elapsed >= 0.025
+
+
+def test_linger_window():
+    async def main(linger):
+        p = _pipeline(coalesce_window=0.1)
+        start = monotonic()
+        await p.send_group_msg(group_id=1, message='x', linger=linger)
+        return monotonic() - start
+    assert asyncio.run(main(True)) >= 0.1
+    assert asyncio.run(main(False)) < 0.1
+
+
+@pytest.fixture
+def api(bot, monkeypatch):
+    fake = FakeBot()
+    monkeypatch.setattr(bot, 'call_action', fake.call_action, raising=False)
+    monkeypatch.setattr(outbound.pipeline, 'coalesce_window', 0.1)
+    monkeypatch.setattr(outbound.pipeline, 'group_rate', 1000)
+    monkeypatch.setattr(outbound.pipeline, 'group_burst', 1000)
+    return fake
+
+
+def _group_event():
+    return Event.from_payload({'post_type': 'message', 'message_type': 'group', 'sub_type': 'normal',
+                               'self_id': 7, 'group_id': 9, 'user_id': 5, 'message_id': 1,
+                               'message': 'x', 'raw_message': 'x'})
+
+
+def test_event_reply_goes_through_pipeline_without_waiting(bot, api):
+    async def main():
+        start = monotonic()
+        await bot.send(_group_event(), 'reply')
+        return monotonic() - start
+    assert asyncio.run(main()) < 0.1
+    action, params = api.calls[-1]
+    assert action == 'send_group_msg'
+    assert params['group_id'] == 9 and params['self_id'] == 7 and 'user_id' not in params
+
+
+def test_private_messages_bypass_pipeline(bot, api):
+    asyncio.run(bot.send_msg(message_type='private', user_id=3, message='pm'))
+    assert api.calls[-1] == ('send_msg', {'message_type': 'private', 'user_id': 3, 'message': 'pm'})
+
+
+def test_reply_and_broadcast_share_account_stats(bot, api, monkeypatch):
+    router = AccountRouter()
+    monkeypatch.setattr(outbound, 'router', router)
+    monkeypatch.setattr(broadcast, 'router', router)
+    monkeypatch.setattr(bot, '_wsr_api_clients', {'7': None})
+    async def main():
+        await bot.send(_group_event(), 'reply')     # 事件中的 self_id 是 int
+        await broadcast.broadcaster.send(hoshino.get_self_ids(), 9, 'news')
+        await bot.send_group_msg(self_id='7', group_id=9, message='direct')    # 直接以 str 的键发送
+    asyncio.run(main())
+    assert list(router._stats) == [7]
+    assert router._stats[7].total == 3
+    assert [params['self_id'] for _, params in api.calls[-3:]] == [7, 7, 7]
+    assert list(outbound.pipeline._account_buckets) == [7]
@@ -0,0 +1,85 @@
+import os
+import random
+
+import pytest
+
+from hoshino.util.textfilter.compiled import CompiledFilter, compile_words
+from hoshino.util.textfilter.filter import DFAFilter
+
+_WORDFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'hoshino', 'util', 'textfilter', 'sensitive_words.txt')
+
+
+def _pair(words):
+    dfa = DFAFilter()
+    for w in words:
+        dfa.add(w)
+    return dfa, CompiledFilter(compile_words(words))
+
+
+def test_doc_example():
+    dfa, cf = _pair(['sexy'])
+    assert cf.filter('hello sexy baby') == dfa.filter('hello sexy baby') == 'hello **** baby'
+
+
+def test_first_character():
+    dfa, cf = _pair(['1989年'])
+    assert cf.filter('1989') == '1989'
+
+
+@pytest.mark.parametrize('words, text', [
+    (['ab', 'abc'], 'xabcx'),     # 以最短的词替换
+    (['abc', 'ab'], 'xabcx'),
+    (['abc', 'bcd'], 'abcd'),     # 替换过的部分不再参与匹配
+    (['bc', 'abcd'], 'abce'),
+    (['a', 'aa'], 'aaa'),
+])
+def test_overlaps(words, text):
+    dfa, cf = _pair(words)
+    assert cf.filter(text, '#') == dfa.filter(text, '#')
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_dfa_filter(seed):
+    rnd = random.Random(seed)
+    alphabet = 'abc敏感词'
+    words = [''.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 4))) for _ in range(15)]
+    dfa, cf = _pair(words)
+    texts = [''.join(rnd.choice(alphabet + ' ') for _ in range(rnd.randint(0, 40))) for _ in range(100)]
+    assert cf.filter_many(texts) == [dfa.filter(t) for t in texts]
+
+
+def test_real_word_list(tmp_path):
+    dfa = DFAFilter()
+    dfa.parse(_WORDFILE)
+    cf = CompiledFilter.from_wordfile(_WORDFILE, str(tmp_path))
+    with open(_WORDFILE, encoding='utf8') as f:
+        words = [w.strip() for w in f if w.strip()]
+    rnd = random.Random(0)
+    for _ in range(300):
+        text = ''.join(rnd.choice((rnd.choice(words), '今天天气不错', ' ', 'abc')) for _ in range(rnd.randint(1, 6)))
+        assert cf.filter(text) == dfa.filter(text), text
+
+
+def test_cache_file_reused_and_replaced(tmp_path):
+    wordfile = tmp_path / 'words.txt'
+    cache_dir = tmp_path / 'cache'
+    wordfile.write_text('foo\nbar\n', encoding='utf8')
+    assert CompiledFilter.from_wordfile(str(wordfile), str(cache_dir)).filter('foobar') == '******'
+    first = os.listdir(cache_dir)
+    assert len(first) == 1
+    assert CompiledFilter.from_wordfile(str(wordfile), str(cache_dir)).filter('foo') == '***'
+    assert os.listdir(cache_dir) == first
+
+    wordfile.write_text('baz\n', encoding='utf8')
+    cf = CompiledFilter.from_wordfile(str(wordfile), str(cache_dir))
+    assert cf.filter('foobaz') == 'foo***'
+    assert len(os.listdir(cache_dir)) == 1 and os.listdir(cache_dir) != first
+
+
+def test_rejects_corrupt_cache():
+    with pytest.raises(ValueError):
+        CompiledFilter(b'nope')
+    data = compile_words(['abc'])
+    with pytest.raises(ValueError):
+        CompiledFilter(data[:-1])
@@ -0,0 +1,62 @@
+import operator
+import random
+
+import pytest
+
+from hoshino.util import hans
+from hoshino.util.trie import FrozenTrie, Item
+
+
+def _brute_prefixes(items, text):
+    return sorted(((k, v) for k, v in items.items() if text.startswith(k)), key=lambda kv: -len(kv[0]))
+
+
+def test_doc_example():
+    t = FrozenTrie({'ab': 1, 'abc': 2})
+    assert t.longest_prefix('abcd') == Item('abc', 2)
+    assert t.longest_prefix('abx') == Item('ab', 1)
+    assert t.longest_prefix('x') is None
+    assert t.longest_prefix('') is None
+
+
+def test_mapping_interface():
+    t = FrozenTrie({'帮助': 1, '帮': 2})
+    assert len(t) == 2
+    assert '帮助' in t and '帮助我' not in t
+    assert t['帮'] == 2
+    assert t.get('x') is None
+    with pytest.raises(KeyError):
+        t['帮助我']
+    assert sorted(t.keys()) == ['帮', '帮助']
+
+
+def test_empty_key():
+    t = FrozenTrie({'': 0, 'a': 1})
+    assert t.longest_prefix('b') == Item('', 0)
+    assert t.prefixes('ab') == [Item('a', 1), Item('', 0)]
+
+
+def test_fold_matches_traditional():
+    t = FrozenTrie({'会战': ['a']}, fold=hans.char_table(), merge=operator.add)
+    item = t.longest_prefix('會戰 出刀')
+    assert item == Item('會戰', ['a'])     # key 为原文
+
+
+def test_fold_merges_duplicates():
+    t = FrozenTrie([('会战', ['a']), ('會戰', ['b'])], fold=hans.char_table(), merge=operator.add)
+    assert len(t) == 1
+    assert t['会战'] == ['a', 'b']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    alphabet = 'ab出刀'
+    items = {''.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 5))): i for i in range(30)}
+    t = FrozenTrie(items)
+    for _ in range(100):
+        text = ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 8)))
+        expected = _brute_prefixes(items, text)
+        assert [tuple(i) for i in t.prefixes(text)] == expected
+        longest = t.longest_prefix(text)
+        assert (tuple(longest) if longest else None) == (expected[0] if expected else None)
@@ -0,0 +1,134 @@
+import re
+
+import pytest
+
+from hoshino import trigger
+from hoshino.service import ServiceFunc
+from hoshino.typing import CQEvent, Message, MessageSegment
+
+
+class FakeService:
+
+    def __init__(self, name):
+        self.name = name
+
+
+A, B = FakeService('a'), FakeService('b')
+
+
+def _sf(sv, name, normalize_text=False):
+    async def func(bot, ev):
+        pass
+    func.__name__ = name
+    return ServiceFunc(sv, func, False, normalize_text)
+
+
+def _event(message):
+    return CQEvent({'post_type': 'message', 'message_type': 'group', 'sub_type': 'normal',
+                    'group_id': 1, 'user_id': 1, 'message': Message(message)})
+
+
+def _match(triggers, message, services=None):
+    ev = _event(message)
+    return [sf.__name__ for sf in trigger.iter_handlers(ev, triggers, services)], ev
+
+
+@pytest.fixture
+def chain():
+    fullmatch, prefix, suffix = trigger.FullmatchTrigger(), trigger.PrefixTrigger(), trigger.SuffixTrigger()
+    rex, keyword = trigger.RexTrigger(), trigger.KeywordTrigger()
+    fullmatch.add('JJC', _sf(A, 'full_a'))
+    fullmatch.add('ガチャ', _sf(B, 'full_b'))
+    prefix.add('帮助', _sf(A, 'prefix_a'))
+    prefix.add('帮助我', _sf(B, 'prefix_b'))
+    suffix.add('在吗', _sf(B, 'suffix_b'))
+    rex.add(re.compile(r'^\d+w$'), _sf(A, 'rex_a'))
+    keyword.add('会战', _sf(B, 'keyword_b'))
+    return [fullmatch, prefix, suffix, rex, keyword]
+
+
+@pytest.mark.parametrize('message', ['JJC', ' jjc ', 'ＪＪＣ'])
+def test_fullmatch_ignores_case_and_width(chain, message):
+    names, ev = _match(chain, message)
+    assert names == ['full_a']
+    assert str(ev.message) == ''
+
+
+def test_fullmatch_normalization_can_shorten_text(chain):
+    # 半角片假名与浊点在规范化后合为一字, 比最长的触发词还长的原文也可能命中
+    assert _match(chain, 'ｶﾞﾁｬ')[0] == ['full_b']
+
+
+def test_fullmatch_needs_single_text_segment(chain):
+    names, _ = _match(chain, Message('JJC') + MessageSegment.at(1))
+    assert 'full_a' not in names
+
+
+def test_services_filter(chain):
+    assert _match(chain, '帮助我 看看', frozenset({B}))[0] == ['prefix_b']
+    assert _match(chain, '会战 100w', frozenset({A}))[0] == []
+    assert _match(chain, '100w', frozenset({A}))[0] == ['rex_a']
+    assert _match(chain, '100w', frozenset({B}))[0] == []
+    assert _match(chain, '明天会战', frozenset())[0] == []
+    assert _match(chain, '明天会战')[0] == ['keyword_b']
+
+
+def test_prefix_falls_back_to_enabled_shorter_prefix(chain):
+    names, ev = _match(chain, '帮助我 看看', frozenset({A}))
+    assert names == ['prefix_a']
+    assert ev['prefix'] == '帮助' and str(ev.message) == '我 看看'
+    names, ev = _match(chain, '幫助我 看看', frozenset({A, B}))     # 繁体同样命中最长的前缀
+    assert names == ['prefix_b']
+    assert str(ev.message) == '看看'
+
+
+def test_suffix_filter(chain):
+    assert _match(chain, '老婆在吗', frozenset({B}))[0] == ['suffix_b']
+    assert _match(chain, '老婆在吗', frozenset({A}))[0] == []
+
+
+class FakeGroupService(FakeService):
+
+    def __init__(self, name, enabled):
+        super().__init__(name)
+        self.enabled = set(enabled)
+
+    def check_enabled(self, group_id):
+        return group_id in self.enabled
+
+
+def test_enabled_services_cache(monkeypatch):
+    sv = FakeGroupService('c', {1})
+    monkeypatch.setattr(trigger, '_services', {sv})
+    trigger.invalidate(1)
+    trigger.invalidate(2)
+    assert trigger.enabled_services(1) == frozenset({sv})
+    assert trigger.enabled_services(2) == frozenset()
+    sv.enabled.add(2)
+    assert trigger.enabled_services(2) == frozenset()   # 服务开关时由 Service 调用 invalidate
+    trigger.invalidate(2)
+    assert trigger.enabled_services(2) == frozenset({sv})
+    trigger.invalidate(1)
+    trigger.invalidate(2)
+
+
+_REX_SAMPLES = ['abc', 'ABC', 'xAbC', 'bc', 'abbc', 'bar', 'foobar', 'fooba', 'x', 'ax', 'a x', 'xa', 'abc c',
+                'ab', 'ac', 'abababc', 'c', '1a2', '1A2', 'a1b', 'A1B', 'ab\nab', 'zab', '来10抽', '来抽', 'ＡＢＣ', '']
+
+
+@pytest.mark.parametrize('pattern', [
+    r'(?i)abc', r'(?i)a1b', r'a?bc', r'(foo|)bar', r'(foo|ba)r', r'a(b|)c', r'\bx', r'x\b', r'(?>ab)c', r'(?:ab)++c',
+    r'(?:ab)*+c', r'a*?bc', r'(ab){2,}c', r'(ab){0,2}c', r'^abc', r'\Aab', r'(?m)^ab', r'(?i)^1a2', r'^(?i:a)bc',
+    r'(?i)(?-i:ab)c', r'^a|b', r'a(?=b)bc', r'a(?!x)c', r'(?<=a)bc', r'(a)?b(?(1)c|x)', r'(a)b\1', r'[ab]c',
+    r'来(\d+)抽', r'(?x) a b  # 注释', r'abc$', r'x*', r'.', r'\d', r'',
+])
+@pytest.mark.parametrize('normalize_text', [False, True])
+def test_rex_prefilter_never_drops_a_match(pattern, normalize_text):
+    rex = re.compile(pattern)
+    t = trigger.RexTrigger()
+    t.add(rex, _sf(A, 'rex', normalize_text))
+    for message in _REX_SAMPLES:
+        ev = _event(message) if message else _event(MessageSegment.at(1))
+        text = trigger._norm_text(ev) if normalize_text else trigger._plain_text(ev)
+        hit = [sf.__name__ for sf in t.find_handler(ev)]
+        assert hit == (['rex'] if rex.search(text) else []), message